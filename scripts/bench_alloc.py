@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Allocations and latency per query of the exact-scan kernel.
+
+Compares the old kernel, which upcast each 20k-row chunk with
+`vectors[i:j].astype(np.float32)`, with Float16Store.score, which upcasts
+SCAN_BLOCK rows at a time into a reused per-thread scratch buffer. Reports
+latency per query and the peak memory numpy allocated for temporaries during
+one query (via tracemalloc, which numpy reports its buffers to).
+
+Usage:
+    uv run python scripts/bench_alloc.py
+    uv run python scripts/bench_alloc.py --size 1000000 --queries 20
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from rtt import vector
+
+
+def old_score(vectors: np.ndarray, q: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.float32)
+    for i in range(0, len(vectors), vector.CHUNK):
+        j = min(i + vector.CHUNK, len(vectors))
+        out[i:j] = vectors[i:j].astype(np.float32) @ q
+    return out
+
+
+def new_score(store: vector.Float16Store, q: np.ndarray) -> np.ndarray:
+    out = np.empty(len(store.vectors), dtype=np.float32)
+    for i in range(0, len(store.vectors), vector.CHUNK):
+        j = min(i + vector.CHUNK, len(store.vectors))
+        out[i:j] = store.score(q, slice(i, j))
+    return out
+
+
+def measure(fn, queries: np.ndarray) -> tuple[float, float]:
+    fn(queries[0])
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    ms = (time.perf_counter() - t0) / len(queries) * 1000
+    tracemalloc.start()
+    peak = 0
+    for q in queries:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(q)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = np.empty((args.size, 768), dtype=np.float16)
+    for i in range(0, args.size, vector.CHUNK):
+        vectors[i:i + vector.CHUNK] = rng.standard_normal((min(vector.CHUNK, args.size - i), 768))
+    store = vector.Float16Store(vectors)
+    queries = rng.standard_normal((args.queries, 768)).astype(np.float32)
+    assert np.allclose(old_score(vectors, queries[0]), new_score(store, queries[0]), atol=1e-3)
+    print(f"{args.size} float16 rows, {args.queries} queries, CHUNK={vector.CHUNK}, SCAN_BLOCK={vector.SCAN_BLOCK}")
+
+    for label, fn in [("astype per chunk", lambda q: old_score(vectors, q)), ("scratch buffer", lambda q: new_score(store, q))]:
+        ms, peak = measure(fn, queries)
+        print(f"{label:<17} {ms:7.1f}ms/query  peak temporaries {peak / 2**20:7.1f}MB/query")
+
+
+if __name__ == "__main__":
+    main()
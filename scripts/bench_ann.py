@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Recall@k vs latency of the approximate search engines against the exact scan.
+
+Builds a corpus (synthetic clustered vectors, or real .rtt files), runs the
+same queries through exact search and each approximate setting, and prints
+recall@k, median/p95 latency and the fraction of vectors scored per query.
+
+Usage:
+    uv run python scripts/bench_ann.py --size 200000
+    uv run python scripts/bench_ann.py --size 20000 --engines ivf hnsw
+    uv run python scripts/bench_ann.py --rtt data/videos/ --queries 200 -k 50
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+from rtt import package, vector
+
+
+def synthetic_vectors(size: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = 0.5 * np.random.default_rng(0).standard_normal((clusters, 768)).astype(np.float32)
+    return centers[rng.integers(0, clusters, size)] + rng.standard_normal((size, 768)).astype(np.float32)
+
+
+def synthetic_table(size: int, clusters: int, seed: int) -> pa.Table:
+    emb = synthetic_vectors(size, clusters, seed)
+    return pa.table({
+        "segment_id": [f"s{i}" for i in range(size)],
+        "video_id": [f"v{i // 100}" for i in range(size)],
+        "start_seconds": np.arange(size, dtype=np.float64) % 100,
+        "collection": [f"c{i % 4}" for i in range(size)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    })
+
+
+def load_tables(paths: list[Path]) -> list[pa.Table]:
+    files = [f for p in paths for f in (sorted(p.glob("**/*.rtt")) if p.is_dir() else [p])]
+    return [package.load_metadata(f)[1] for f in files]
+
+
+def run(db: vector.Database, queries: np.ndarray, k: int) -> tuple[list[set[str]], np.ndarray]:
+    found, times = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        rows = db.closest(q.tolist(), n=k)
+        times.append(time.perf_counter() - t0)
+        found.append({r["segment_id"] for r in rows})
+    return found, np.array(times) * 1000
+
+
+def report(label: str, found: list[set[str]], truth: list[set[str]], ms: np.ndarray, scanned: float | None = None):
+    recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+    scanned_s = f"{scanned:6.1%}" if scanned is not None else "     -"
+    print(f"{label:<24} recall={recall:.3f}  p50={np.median(ms):7.2f}ms  p95={np.percentile(ms, 95):7.2f}ms  scanned={scanned_s}")
+
+
+def build(engine: str, tables: list[pa.Table], **kwargs) -> vector.Database:
+    db = vector.Database.memory(engine=engine, **kwargs)
+    for table in tables:
+        db.add_table(table)
+    t0 = time.perf_counter()
+    db._ensure_merged()
+    print(f"{engine}/{db.storage}: {len(db._embeddings)} vectors, {db._store.nbytes / 2**20:.0f}MB resident, built in {time.perf_counter() - t0:.1f}s")
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", nargs="*", type=Path, help=".rtt files or directories (default: synthetic corpus)")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--engines", nargs="*", choices=["ivf", "hnsw"], default=["ivf"])
+    parser.add_argument("--storage", choices=["float16", "int8", "pq"], default="float16", help="Embedding storage for the approximate engines")
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[96, 48], help="PQ subspace counts to sweep for the exact scan")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[50, 200], help="Re-rank depths to sweep for the int8 exact scan")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    args = parser.parse_args()
+
+    tables = load_tables(args.rtt) if args.rtt else [synthetic_table(args.size, args.clusters, seed=0)]
+    exact = build("exact", tables)
+
+    if args.rtt:
+        rng = np.random.default_rng(1)
+        base = exact._embeddings[rng.choice(len(exact._embeddings), args.queries, replace=False)].astype(np.float32)
+        queries = base + 0.02 * rng.standard_normal(base.shape).astype(np.float32)
+    else:
+        queries = synthetic_vectors(args.queries, args.clusters, seed=1)
+
+    truth, ms = run(exact, queries, args.k)
+    report("exact", truth, truth, ms, 1.0)
+
+    quantized = build("exact", tables, storage="int8")
+    for rerank in args.rerank:
+        quantized.rerank = rerank
+        found, ms = run(quantized, queries, args.k)
+        report(f"int8 rerank={rerank}", found, truth, ms, 1.0)
+
+    for m in args.pq_m:
+        pq = build("exact", tables, storage="pq", pq_m=m)
+        found, ms = run(pq, queries, args.k)
+        report(f"pq m={m} rerank={pq.rerank}", found, truth, ms, 1.0)
+
+    if "ivf" in args.engines:
+        ivf = build("ivf", tables, nlist=args.nlist, storage=args.storage)
+        sizes = np.diff(ivf._ivf.offsets)
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            found, ms = run(ivf, queries, args.k)
+            scanned = np.mean([
+                sizes[vector._top_k(ivf._ivf.centroids @ (q / np.linalg.norm(q)), nprobe)].sum() for q in queries
+            ]) / len(exact._embeddings)
+            report(f"ivf nprobe={nprobe}", found, truth, ms, scanned)
+
+    if "hnsw" in args.engines:
+        hnsw = build("hnsw", tables, storage=args.storage)
+        for ef in args.ef:
+            hnsw.ef_search = ef
+            found, ms = run(hnsw, queries, args.k)
+            report(f"hnsw ef={ef}", found, truth, ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Search throughput and latency with and without query micro-batching.
+
+Serves a synthetic corpus through the ASGI app in-process, with an embedder
+that simulates Ollama (a fixed cost per /api/embed call plus a small cost
+per text), and fires `--concurrency` searches at a time with the result
+cache off. Prints requests/s and p50/p95 latency for each batch window,
+plus how many queries each embedding call and scoring pass served.
+
+Usage:
+    uv run python scripts/bench_batching.py
+    uv run python scripts/bench_batching.py --size 500000 --concurrency 64 --windows 0 2 5 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import httpx
+import numpy as np
+import pyarrow as pa
+
+from rtt import embed, server, vector
+
+
+class SimulatedOllama:
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self.rng = np.random.default_rng(1)
+
+    async def embed(self, text: str) -> list[float]:
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return self.rng.standard_normal((len(texts), 768)).tolist()
+
+
+def synthetic_db(size: int) -> vector.Database:
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((size, 768)).astype(np.float32)
+    db = vector.Database.memory()
+    db.add_table(pa.table({
+        "segment_id": [f"s{i}" for i in range(size)],
+        "video_id": [f"v{i // 100}" for i in range(size)],
+        "start_seconds": np.arange(size, dtype=np.float64) % 100,
+        "end_seconds": np.arange(size, dtype=np.float64) % 100 + 4,
+        "transcript_raw": [""] * size,
+        "transcript_enriched": [""] * size,
+        "frame_path": [""] * size,
+        "collection": [f"c{i % 4}" for i in range(size)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    }))
+    db.compact()
+    return db
+
+
+async def run(db: vector.Database, window: float, args) -> None:
+    ollama = SimulatedOllama(args.call_ms, args.text_ms)
+    embedder = embed.BatchingEmbedder(ollama, window=window) if window else ollama
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = server._build_app(server.Snapshot(db, {}, {}), embedder, result_cache_size=0, batch_window=window)
+    latencies = []
+
+    async def one(client: httpx.AsyncClient, i: int):
+        t0 = time.perf_counter()
+        resp = await client.get(f"/search?q=query+{i}&n={args.n}")
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        t0 = time.perf_counter()
+        for start in range(0, args.requests, args.concurrency):
+            await asyncio.gather(*[one(client, i) for i in range(start, min(start + args.concurrency, args.requests))])
+        elapsed = time.perf_counter() - t0
+        stats = (await client.get("/stats")).json()
+    ms = np.array(latencies) * 1000
+    batches = stats.get("score_batches", {"batches": args.requests, "queries": args.requests})
+    embeds = stats.get("embed_batches", {"batches": args.requests, "queries": args.requests})
+    print(
+        f"window={window * 1000:4.1f}ms  {args.requests / elapsed:6.1f} req/s  p50={np.median(ms):7.1f}ms  "
+        f"p95={np.percentile(ms, 95):7.1f}ms  queries/embed call={embeds['queries'] / embeds['batches']:4.1f}  "
+        f"queries/scoring pass={batches['queries'] / batches['batches']:4.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("-n", type=int, default=50)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5], help="Batch windows in milliseconds")
+    parser.add_argument("--call-ms", type=float, default=20.0, help="Simulated Ollama cost per call")
+    parser.add_argument("--text-ms", type=float, default=2.0, help="Simulated Ollama cost per text")
+    args = parser.parse_args()
+
+    db = synthetic_db(args.size)
+    print(f"{args.size} segments, {args.requests} searches, {args.concurrency} concurrent")
+    for window in args.windows:
+        asyncio.run(run(db, window / 1000, args))
+
+
+if __name__ == "__main__":
+    main()
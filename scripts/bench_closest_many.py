@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Bulk query throughput: a Python loop over closest() vs closest_many().
+
+Builds a synthetic corpus and scores the same block of queries with one
+closest() call per query (a GEMV per embedding chunk, plus result dicts) and
+with closest_many() at several block sizes (one GEMM per chunk, vectorized
+top-k, arrays out). Prints queries/s and checks both return the same rows.
+
+Usage:
+    uv run python scripts/bench_closest_many.py
+    uv run python scripts/bench_closest_many.py --size 1000000 --queries 512 --block 64 256
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from rtt import vector
+
+
+def synthetic_table(size: int) -> tuple[pa.Table, np.ndarray]:
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((size, 768)).astype(np.float32)
+    table = pa.table({
+        "segment_id": [f"s{i}" for i in range(size)],
+        "video_id": [f"v{i // 100}" for i in range(size)],
+        "start_seconds": np.arange(size, dtype=np.float64) % 100,
+        "collection": [f"c{i % 4}" for i in range(size)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    })
+    return table, emb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=128)
+    parser.add_argument("--block", type=int, nargs="+", default=[8, 32, 128], help="Queries per closest_many call")
+    parser.add_argument("-n", type=int, default=20)
+    args = parser.parse_args()
+
+    table, emb = synthetic_table(args.size)
+    db = vector.Database.memory()
+    db.add_table(table)
+    db.compact()
+    rng = np.random.default_rng(1)
+    queries = emb[rng.choice(args.size, args.queries, replace=False)] + rng.standard_normal((args.queries, 768)).astype(np.float32)
+    print(f"{args.size} segments, {args.queries} queries, n={args.n}")
+
+    t0 = time.perf_counter()
+    looped = [[r["segment_id"] for r in db.closest(q.tolist(), n=args.n)] for q in queries]
+    base = args.queries / (time.perf_counter() - t0)
+    print(f"closest() loop        {base:8.1f} queries/s")
+
+    for block in args.block:
+        t0 = time.perf_counter()
+        rows = np.concatenate([db.closest_many(queries[i:i + block], n=args.n)[0] for i in range(0, args.queries, block)])
+        rate = args.queries / (time.perf_counter() - t0)
+        same = np.mean([a == b for a, b in zip(db.segment_ids(rows).tolist(), looped)])
+        print(f"closest_many block={block:<4} {rate:8.1f} queries/s ({rate / base:4.1f}x), identical rows for {same:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Frame-request throughput under concurrent load.
+
+Writes a corpus of .rtt files with synthetic JPEG-sized frames, then fires
+random frame requests from a thread pool, the way a results grid does, and
+prints requests/s for opening a ZipFile per request vs package.ArchivePool
+(without and with its frame byte cache), directly and through the
+/static/frames endpoint.
+
+Usage:
+    uv run python scripts/bench_frames.py
+    uv run python scripts/bench_frames.py --files 500 --frames 100 --concurrency 1 16 64
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from rtt import package, server
+from rtt import types as t
+
+
+class ZeroEmbedder:
+    def embed(self, text: str) -> list[float]:
+        return [0.0] * 768
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed(text) for text in texts]
+
+
+def write_corpus(directory: Path, files: int, frames: int, frame_bytes: int, legacy: bool):
+    rng = np.random.default_rng(0)
+    frames_dir = directory / "frames"
+    frames_dir.mkdir()
+    for j in range(frames):
+        (frames_dir / f"{j * 5:06d}.jpg").write_bytes(b"\xff\xd8" + rng.bytes(frame_bytes))
+    for i in range(files):
+        vid = f"v{i:05d}"
+        video = t.Video(video_id=vid, title=vid, source_url="", context="", duration_seconds=frames * 5.0)
+        segments = [
+            t.Segment(segment_id=f"{vid}_{j:05d}", video_id=vid, start_seconds=j * 5.0, end_seconds=j * 5.0 + 4,
+                      transcript_raw="", text_embedding=[0.0] * 768, frame_path=f"frames/{j * 5:06d}.jpg")
+            for j in range(frames)
+        ]
+        path = package.create(video, segments, frames_dir, directory / f"{vid}.rtt")
+        if legacy:
+            with zipfile.ZipFile(path) as src:
+                entries = [(name, src.read(name)) for name in src.namelist()]
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as dst:
+                for name, data in entries:
+                    dst.writestr(name, data)
+
+
+def zipfile_per_request(path: Path, name: str) -> bytes:
+    with zipfile.ZipFile(path, "r") as zf:
+        return zf.read(name)
+
+
+def throughput(fn, requests: list[tuple], concurrency: int) -> float:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in pool.map(lambda args: fn(*args), requests):
+            pass
+    return len(requests) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=200, help="Frames per .rtt file")
+    parser.add_argument("--frame-kb", type=int, default=25)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--frame-cache-mb", type=int, default=256)
+    parser.add_argument("--legacy", action="store_true", help="Write deflated v1-style archives")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_corpus(tmp, args.files, args.frames, args.frame_kb * 1024, args.legacy)
+        rng = np.random.default_rng(1)
+        paths = sorted(tmp.glob("*.rtt"))
+        picks = [(int(f), int(j)) for f, j in zip(rng.integers(0, len(paths), args.requests), rng.integers(0, args.frames, args.requests))]
+        direct = [(paths[f], f"frames/{j * 5:06d}.jpg") for f, j in picks]
+        urls = [(f"/static/frames/{paths[f].stem}/{j * 5:06d}.jpg",) for f, j in picks]
+        with contextlib.redirect_stdout(io.StringIO()):
+            client = TestClient(server.create_app(tmp, embedder=ZeroEmbedder(), frame_cache_bytes=args.frame_cache_mb * 2**20))
+        print(f"{args.files} files x {args.frames} frames of {args.frame_kb}KB, {args.requests} requests, {os.cpu_count()} cores")
+
+        def get(url: str):
+            assert client.get(url).status_code == 200
+
+        for concurrency in args.concurrency:
+            pool = package.ArchivePool()
+            cached = package.ArchivePool(cache_bytes=args.frame_cache_mb * 2**20)
+            throughput(cached.read, direct, concurrency)
+            old = throughput(zipfile_per_request, direct, concurrency)
+            new = throughput(pool.read, direct, concurrency)
+            warm = throughput(cached.read, direct, concurrency)
+            http = throughput(get, urls, concurrency)
+            stats = cached.stats()
+            print(
+                f"concurrency={concurrency:<3} ZipFile per request {old:6.0f} req/s  "
+                f"ArchivePool {new:6.0f} req/s ({new / old:4.1f}x)  "
+                f"cached {warm:7.0f} req/s (hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.0%})  "
+                f"endpoint {http:5.0f} req/s"
+            )
+            pool.close()
+            cached.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""BM25 index size, build time and query latency, alone and fused with vectors.
+
+Builds a synthetic corpus whose transcripts draw words from a Zipf
+distribution (a few very common words, a long tail of rare ones), then
+reports how long BM25Index takes to build, how many bytes its posting arrays
+use next to the raw transcript text, and p50/p95 latency for text-only
+(`search_text`) and hybrid (`hybrid`, vector + BM25 with reciprocal-rank
+fusion) queries made of common, rare and mixed terms.
+
+Usage:
+    uv run python scripts/bench_lexical.py
+    uv run python scripts/bench_lexical.py --size 1000000 --vocab 200000 --queries 50
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from rtt import vector
+
+
+def synthetic_table(size: int, vocab: int, words: int) -> tuple[pa.Table, list[str]]:
+    rng = np.random.default_rng(0)
+    terms = np.array([f"w{i}" for i in range(vocab)])
+    ranks = np.minimum(rng.zipf(1.1, (size, words)), vocab) - 1
+    texts = [" ".join(row) for row in terms[ranks]]
+    emb = rng.standard_normal((size, 768)).astype(np.float32)
+    table = pa.table({
+        "segment_id": [f"s{i}" for i in range(size)],
+        "video_id": [f"v{i // 100}" for i in range(size)],
+        "start_seconds": np.arange(size, dtype=np.float64) % 100,
+        "transcript_raw": texts,
+        "collection": [f"c{i % 4}" for i in range(size)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    })
+    return table, texts
+
+
+def latency(fn, queries: list) -> str:
+    fn(queries[0])
+    ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        ms.append((time.perf_counter() - t0) * 1000)
+    return f"p50={np.median(ms):7.2f}ms  p95={np.percentile(ms, 95):7.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=30, help="Words per transcript")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("-n", type=int, default=50)
+    args = parser.parse_args()
+
+    table, texts = synthetic_table(args.size, args.vocab, args.words)
+    db = vector.Database.memory(lexical=True)
+    db.add_table(table)
+    db.compact()
+    t0 = time.perf_counter()
+    lexical = vector.BM25Index.build(vector._segment_texts(db._merged))
+    build = time.perf_counter() - t0
+    text_bytes = sum(len(text) for text in texts)
+    print(
+        f"{args.size} segments, {len(lexical.terms)} terms, {len(lexical.rows)} postings: built in {build:.1f}s, "
+        f"{lexical.nbytes / 2**20:.1f}MB of arrays for {text_bytes / 2**20:.1f}MB of text"
+    )
+
+    rng = np.random.default_rng(1)
+    picks = {
+        "common": [f"w{a} w{b}" for a, b in rng.integers(0, 10, (args.queries, 2))],
+        "rare": [f"w{a} w{b}" for a, b in rng.integers(args.vocab // 10, args.vocab, (args.queries, 2))],
+        "mixed": [f"w{a} w{b} w{c}" for a, b, c in zip(*rng.integers(0, args.vocab, (3, args.queries)))],
+    }
+    embedding = rng.standard_normal(768).tolist()
+    for label, queries in picks.items():
+        text = latency(lambda q: db.search_text(q, n=args.n), queries)
+        hybrid = latency(lambda q: db.hybrid(embedding, q, n=args.n), queries)
+        print(f"{label:<7} search_text {text}   hybrid {hybrid}")
+    print(f"vector  closest     {latency(lambda q: db.closest(embedding, n=args.n), picks['rare'])}")
+
+
+if __name__ == "__main__":
+    main()
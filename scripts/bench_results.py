@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Per-request cost of turning search hits into result dicts.
+
+Compares the per-cell `table.column(name)[i].as_py()` materialization that
+vector.Database used to do on its merged table (one chunk per .rtt file)
+with a single `table.take(indices).to_pylist()`, on both the chunked table
+and the contiguous table the merge now produces.
+
+Usage:
+    uv run python scripts/bench_results.py
+    uv run python scripts/bench_results.py --rows 500000 --n 50 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+
+
+def synthetic_table(rows: int, rows_per_file: int) -> pa.Table:
+    text = "the narrator explains how the new highway will connect every town in the valley " * 3
+    table = pa.table({
+        "segment_id": [f"v{i // 100}_{i % 100:05d}" for i in range(rows)],
+        "video_id": [f"v{i // 100}" for i in range(rows)],
+        "start_seconds": np.arange(rows, dtype=np.float64),
+        "end_seconds": np.arange(rows, dtype=np.float64) + 4,
+        "transcript_raw": [text] * rows,
+        "transcript_enriched": [text + " enriched"] * rows,
+        "frame_path": [f"frames/{i % 100:06d}.jpg" for i in range(rows)],
+        "has_speech": [True] * rows,
+        "source": ["transcript"] * rows,
+        "collection": [f"c{i % 4}" for i in range(rows)],
+    })
+    return pa.concat_tables([table.slice(i, rows_per_file) for i in range(0, rows, rows_per_file)])
+
+
+def per_cell(table: pa.Table, indices: np.ndarray) -> list[dict]:
+    names = table.schema.names
+    return [{name: table.column(name)[int(i)].as_py() for name in names} for i in indices]
+
+
+def columnar(table: pa.Table, indices: np.ndarray) -> list[dict]:
+    return table.take(indices).to_pylist()
+
+
+def timed(fn, table: pa.Table, batches: list[np.ndarray]) -> float:
+    t0 = time.perf_counter()
+    for indices in batches:
+        fn(table, indices)
+    return (time.perf_counter() - t0) / len(batches) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--n", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--rows-per-file", type=int, default=100, help="Rows per table chunk, like one .rtt file each")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    chunked = synthetic_table(args.rows, args.rows_per_file)
+    combined = chunked.combine_chunks()
+    rng = np.random.default_rng(0)
+    for n in args.n:
+        batches = [rng.choice(args.rows, size=n, replace=False) for _ in range(args.requests)]
+        assert per_cell(chunked, batches[0]) == columnar(combined, batches[0])
+        old = timed(per_cell, chunked, batches)
+        take_chunked = timed(columnar, chunked, batches)
+        new = timed(columnar, combined, batches)
+        print(
+            f"n={n:<4} per-cell {old:7.2f}ms  take (chunked) {take_chunked:6.2f}ms  "
+            f"take (combined) {new:5.2f}ms  saved {old - new:6.2f}ms/request ({old / new:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
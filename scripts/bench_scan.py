@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Exact-search latency vs scan threads.
+
+Builds a synthetic corpus and runs the same queries through the exact scan
+with each --scan-threads setting, printing p50/p95 latency per query and the
+speed-up over a single thread. Shards only run in parallel where numpy
+releases the GIL (the float16 -> float32 conversion and the dot products), so
+expect the gain to track physical cores on large corpora.
+
+Usage:
+    uv run python scripts/bench_scan.py
+    uv run python scripts/bench_scan.py --size 2000000 --threads 1 4 8 16 32
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from rtt import vector
+
+
+def synthetic_table(size: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((size, 768)).astype(np.float32)
+    return pa.table({
+        "segment_id": [f"s{i}" for i in range(size)],
+        "video_id": [f"v{i // 100}" for i in range(size)],
+        "start_seconds": np.arange(size, dtype=np.float64) % 100,
+        "collection": [f"c{i % 4}" for i in range(size)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--storage", choices=["float16", "int8", "pq"], default="float16")
+    parser.add_argument("-n", type=int, default=50)
+    args = parser.parse_args()
+
+    db = vector.Database.memory(storage=args.storage)
+    db.add_table(synthetic_table(args.size))
+    db.compact()
+    queries = np.random.default_rng(1).standard_normal((args.queries, 768)).astype(np.float32)
+    print(f"{args.size} segments ({args.storage}), {args.queries} queries, {os.cpu_count()} cores")
+
+    baseline = None
+    for threads in args.threads:
+        db.scan_threads = threads
+        db.closest(queries[0].tolist(), n=args.n)
+        ms = []
+        for q in queries:
+            t0 = time.perf_counter()
+            db.closest(q.tolist(), n=args.n)
+            ms.append((time.perf_counter() - t0) * 1000)
+        p50 = np.median(ms)
+        baseline = baseline or p50
+        print(f"scan_threads={threads:<3} p50={p50:7.1f}ms  p95={np.percentile(ms, 95):7.1f}ms  speed-up {baseline / p50:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Server startup time of loading a corpus of .rtt files vs loader thread count.
+
+Writes a synthetic corpus once (5,000 files of 20 segments by default, cached
+under the rtt cache directory), then times index.load_rtt_files with each
+thread count and prints load/merge time and the speed-up over one thread.
+
+Usage:
+    uv run python scripts/bench_startup.py
+    uv run python scripts/bench_startup.py --files 1000 --threads 1 2 4 8 16
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rtt import index, package, runtime, vector
+from rtt import types as t
+
+TEXT = "the narrator explains how the new highway will connect every town in the valley"
+
+
+def write_corpus(directory: Path, files: int, segments: int):
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for i in range(files):
+        path = directory / f"v{i:05d}.rtt"
+        if path.exists():
+            continue
+        vid = f"v{i:05d}"
+        emb = rng.standard_normal((segments, 768)).astype(np.float32).tolist()
+        video = t.Video(video_id=vid, title=f"Video {i}", source_url="", context=TEXT, duration_seconds=segments * 5.0,
+                        collection=f"c{i % 4}")
+        segs = [
+            t.Segment(segment_id=f"{vid}_{j:05d}", video_id=vid, start_seconds=j * 5.0, end_seconds=j * 5.0 + 4,
+                      transcript_raw=TEXT, transcript_enriched=f"{TEXT} enriched", text_embedding=emb[j],
+                      frame_path=f"frames/{j:06d}.jpg", collection=f"c{i % 4}")
+            for j in range(segments)
+        ]
+        package.create(video, segs, None, path)
+        if i % 500 == 0:
+            print(f"  wrote {i}/{files}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--segments", type=int, default=20, help="Segments per .rtt file")
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--corpus", type=Path, default=None, help="Corpus directory (default: under the rtt cache)")
+    args = parser.parse_args()
+
+    corpus = args.corpus or runtime.cache_dir() / f"bench_startup_{args.files}x{args.segments}"
+    write_corpus(corpus, args.files, args.segments)
+    print(f"{args.files} files x {args.segments} segments in {corpus}, {os.cpu_count()} cores")
+
+    baseline = None
+    for threads in args.threads:
+        db = vector.Database.memory()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            videos, _ = index.load_rtt_files(db, [corpus], workers=threads)
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or elapsed
+        print(
+            f"threads={threads:<3} load+merge {elapsed:6.2f}s  speed-up {baseline / elapsed:4.1f}x  "
+            f"({len(videos)} videos, {db.count()} segments)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -65,11 +65,45 @@ def main():
     p_process.add_argument("--ollama-url", **ollama_url_kwargs)
 
     p_serve = sub.add_parser("serve")
-    p_serve.add_argument("paths", nargs="+", type=Path, help=".rtt files or directories containing them")
+    p_serve.add_argument("paths", nargs="*", type=Path, help=".rtt files or directories containing them")
+    p_serve.add_argument("--index", type=Path, default=None, help="Prebuilt index from `rtt index build`; updated first if paths are also given")
     p_serve.add_argument("--host", default="0.0.0.0")
     p_serve.add_argument("--port", type=int, default=8000)
+    p_serve.add_argument("--engine", choices=["exact", "ivf", "hnsw"], default="exact", help="Search engine (default: exact brute-force scan)")
+    p_serve.add_argument("--nprobe", type=int, default=8, help="IVF posting lists probed per query (default: 8)")
+    p_serve.add_argument("--ef-search", type=int, default=64, help="HNSW candidate list size per query (default: 64)")
+    p_serve.add_argument("--graph", type=Path, default=None, help="HNSW graph file (default: segments.hnsw next to the first path)")
+    p_serve.add_argument("--storage", choices=["float16", "int8", "pq"], default="float16", help="In-memory embedding format (default: float16)")
+    p_serve.add_argument("--rerank", type=int, default=200, help="Candidates re-scored exactly when storage is quantized (default: 200)")
+    p_serve.add_argument("--memory-budget", type=str, default=None, help="Embedding memory budget, e.g. 512MB; picks the storage format automatically")
+    p_serve.add_argument("--workers", type=int, default=1, help="Uvicorn worker processes sharing one memory-mapped index (default: 1)")
+    p_serve.add_argument("--watch", action="store_true", help="Poll the .rtt paths and hot-load new, replaced or deleted files")
+    p_serve.add_argument("--watch-interval", type=float, default=2.0, help="Seconds between --watch polls (default: 2)")
+    p_serve.add_argument("--frame-cache-mb", type=int, default=256, help="In-memory cache of served frame JPEGs per worker, 0 to disable (default: 256)")
+    p_serve.add_argument("--result-cache-size", type=int, default=1024, help="Search responses cached until the index changes, 0 to disable (default: 1024)")
+    p_serve.add_argument("--scan-threads", type=int, default=1, help="Threads splitting one exact search into parallel shards (default: 1)")
+    p_serve.add_argument("--hybrid", action="store_true", help="Build a BM25 keyword index so /search?mode=hybrid works")
+    p_serve.add_argument("--search-threads", type=int, default=None, help="Threads scoring searches per worker (default: CPU count)")
+    p_serve.add_argument("--batch-window-ms", type=float, default=5.0, help="Gather queries arriving within this window into one embedding call and one scoring pass, 0 to disable (default: 5)")
+    p_serve.add_argument("--query-cache-size", type=int, default=10_000, help="Query embeddings kept in memory, 0 to disable (default: 10000)")
+    p_serve.add_argument("--query-cache-ttl", type=float, default=7 * 86400, help="Seconds a cached query embedding stays valid (default: 7 days)")
+    p_serve.add_argument("--query-cache-path", type=Path, default=None, help="Persist cached query embeddings to this file across restarts")
     p_serve.add_argument("--ollama-url", **ollama_url_kwargs)
 
+    p_graph = sub.add_parser("build-graph", help="Build the HNSW search graph for a set of .rtt files")
+    p_graph.add_argument("paths", nargs="+", type=Path, help=".rtt files or directories containing them")
+    p_graph.add_argument("--output", "-o", type=Path, default=None, help="Graph file (default: segments.hnsw next to the first path)")
+
+    p_index = sub.add_parser("index", help="Manage prebuilt search indexes")
+    index_sub = p_index.add_subparsers(dest="index_command", required=True)
+    p_index_build = index_sub.add_parser("build", help="Build or incrementally update an index from .rtt files")
+    p_index_build.add_argument("paths", nargs="+", type=Path, help=".rtt files or directories containing them")
+    p_index_build.add_argument("--output", "-o", type=Path, required=True, help="Index directory, e.g. corpus.rttidx")
+    p_index_build.add_argument("--hybrid", action="store_true", help="Save a BM25 keyword index for `serve --hybrid`")
+
+    p_upgrade = sub.add_parser("upgrade", help="Rewrite .rtt files in place in the current format")
+    p_upgrade.add_argument("paths", nargs="+", type=Path, help=".rtt files or directories containing them")
+
     p_transcribe = sub.add_parser("transcribe")
     p_transcribe.add_argument("paths", nargs="+")
 
@@ -130,11 +164,97 @@ def main():
         runtime.require(needs_ollama=True)
         print(f"[serve] imports starting RSS={_rss()}MB", flush=True)
         import uvicorn
-        from rtt import server
+        from rtt import index, server, vector
         print(f"[serve] imports done RSS={_rss()}MB", flush=True)
-        app = server.create_app(args.paths)
-        print(f"[serve] app ready RSS={_rss()}MB", flush=True)
-        uvicorn.run(app, host=args.host, port=args.port)
+        db_options = dict(
+            engine=args.engine, nprobe=args.nprobe, ef_search=args.ef_search, graph_path=args.graph,
+            storage=args.storage, rerank=args.rerank, scan_threads=args.scan_threads, lexical=args.hybrid,
+            memory_budget=vector.parse_size(args.memory_budget) if args.memory_budget else None,
+        )
+        query_cache = dict(max_entries=args.query_cache_size, ttl=args.query_cache_ttl, path=args.query_cache_path)
+        batch_window = args.batch_window_ms / 1000
+        if args.index:
+            if args.paths and not index.build(args.paths, args.index, lexical=args.hybrid):
+                sys.exit(1)
+            if args.engine == "hnsw" and args.graph is None:
+                db_options["graph_path"] = server.default_graph_path([args.index])
+        elif not args.paths:
+            p_serve.error("give .rtt paths, --index, or both")
+        if args.watch and (not args.paths or args.workers > 1):
+            p_serve.error("--watch needs .rtt paths and a single worker")
+        if args.workers > 1:
+            import json, os, tempfile
+            graph_path = db_options["graph_path"]
+            if args.engine == "hnsw" and graph_path is None:
+                graph_path = server.default_graph_path(args.paths)
+            with tempfile.TemporaryDirectory(prefix="serve_", dir=runtime.cache_dir()) as tmp:
+                index_dir = args.index or Path(tmp)
+                engine = "hnsw" if graph_path else "exact"
+                if args.index:
+                    if graph_path or args.hybrid:
+                        vector.Database.open(index_dir, engine=engine, graph_path=graph_path, lexical=args.hybrid)
+                else:
+                    db = vector.Database.memory(engine=engine, graph_path=graph_path, lexical=args.hybrid)
+                    videos, rtt_paths_by_video = index.load_rtt_files(db, args.paths)
+                    index.save(index_dir, db, videos, rtt_paths_by_video)
+                    del db
+                    print(f"[serve] index saved to {index_dir} RSS={_rss()}MB", flush=True)
+                os.environ["RTT_SERVE_INDEX"] = str(index_dir)
+                os.environ["RTT_OLLAMA_URL"] = runtime.OLLAMA_URL
+                os.environ["RTT_SERVE_OPTIONS"] = json.dumps({
+                    **db_options, "graph_path": str(graph_path) if graph_path else None,
+                    "frame_cache_bytes": args.frame_cache_mb * 2**20, "result_cache_size": args.result_cache_size,
+                    "search_threads": args.search_threads, "batch_window": batch_window,
+                    "query_cache": {**query_cache, "path": str(args.query_cache_path) if args.query_cache_path else None},
+                })
+                uvicorn.run("rtt.server:app_from_env", factory=True, host=args.host, port=args.port, workers=args.workers)
+        else:
+            embedder = server.query_embedder(**query_cache, batch_window=batch_window)
+            if args.index:
+                app = server.open_app(args.index, embedder, frame_cache_bytes=args.frame_cache_mb * 2**20,
+                                      result_cache_size=args.result_cache_size, search_threads=args.search_threads,
+                                      batch_window=batch_window, **db_options)
+            else:
+                app = server.create_app(args.paths, embedder, frame_cache_bytes=args.frame_cache_mb * 2**20,
+                                        result_cache_size=args.result_cache_size, search_threads=args.search_threads,
+                                        batch_window=batch_window, **db_options)
+            if args.watch:
+                app.state.live.watch(args.paths, args.watch_interval)
+            print(f"[serve] app ready RSS={_rss()}MB", flush=True)
+            uvicorn.run(app, host=args.host, port=args.port)
+
+    elif args.command == "index":
+        from rtt import index
+        if not index.build(args.paths, args.output, lexical=args.hybrid):
+            sys.exit(1)
+
+    elif args.command == "upgrade":
+        from rtt import index, package
+        upgraded = current = failed = 0
+        for rtt_path in index.collect_rtt_files(args.paths):
+            try:
+                if package.upgrade(rtt_path):
+                    upgraded += 1
+                    print(f"  upgraded {rtt_path}")
+                else:
+                    current += 1
+            except Exception as e:
+                failed += 1
+                print(f"  failed {rtt_path}: {e}")
+        print(f"Upgraded {upgraded} files to format v{package.FORMAT_VERSION}, {current} already current, {failed} failed")
+        if failed:
+            sys.exit(1)
+
+    elif args.command == "build-graph":
+        from rtt import index, server, vector
+        output = args.output or server.default_graph_path(args.paths)
+        output.unlink(missing_ok=True)
+        db = vector.Database.memory(engine="hnsw", graph_path=output)
+        index.load_rtt_files(db, args.paths)
+        if not output.exists():
+            print("No segments found.")
+            sys.exit(1)
+        print(f"Saved graph to {output}")
 
     elif args.command == "transcribe":
         runtime.require(needs_ffmpeg=True)
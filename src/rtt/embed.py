@@ -1,8 +1,17 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
 from typing import Protocol, runtime_checkable
 
 import httpx
+import numpy as np
 
 from rtt import runtime
+from rtt.util import MicroBatcher
 
 
 @runtime_checkable
@@ -11,6 +20,12 @@ class Embedder(Protocol):
     def embed_batch(self, texts: list[str]) -> list[list[float]]: ...
 
 
+@runtime_checkable
+class AsyncEmbedder(Protocol):
+    async def embed(self, text: str) -> list[float]: ...
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]: ...
+
+
 class OllamaEmbedder:
     def __init__(self, base_url: str | None = None, model: str | None = None):
         self._base_url = base_url or runtime.OLLAMA_URL
@@ -27,3 +42,214 @@ class OllamaEmbedder:
         )
         resp.raise_for_status()
         return resp.json()["embeddings"]
+
+
+class AsyncOllamaEmbedder:
+    def __init__(self, base_url: str | None = None, model: str | None = None, max_connections: int = 32):
+        self._base_url = base_url or runtime.OLLAMA_URL
+        self._model = model or runtime.OLLAMA_MODEL
+        self._client = httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=60,
+            ),
+        )
+
+    async def embed(self, text: str) -> list[float]:
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        resp = await self._client.post(
+            f"{self._base_url}/api/embed",
+            json={"model": self._model, "input": texts},
+        )
+        resp.raise_for_status()
+        return resp.json()["embeddings"]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class BatchingEmbedder:
+    def __init__(self, inner: AsyncEmbedder, window: float = 0.005, max_batch: int = 32):
+        self.inner = inner
+        self._batcher = MicroBatcher(inner.embed_batch, window=window, max_batch=max_batch)
+
+    async def embed(self, text: str) -> list[float]:
+        return await self._batcher.submit(text)
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return await self.inner.embed_batch(texts)
+
+    def stats(self) -> dict:
+        return {"batches": self._batcher.batches, "queries": self._batcher.items}
+
+    async def aclose(self):
+        if hasattr(self.inner, "aclose"):
+            await self.inner.aclose()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+class CachedEmbedder:
+    def __init__(self, inner: Embedder, max_entries: int = 10_000, ttl: float | None = 7 * 86400,
+                 path: Path | None = None):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._cache: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._inflight: dict[str, Future | asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+        if path is not None and path.exists():
+            self._load(path)
+
+    def _get(self, key: str, now: float) -> list[float] | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key: str, vector: list[float], now: float):
+        self._cache[key] = (now + self.ttl if self.ttl is not None else float("inf"), vector)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def embed(self, text: str) -> list[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._get(key, time.time())
+            if vector is not None:
+                self.hits += 1
+                return vector
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            vector = self.inner.embed(key)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._put(key, vector, time.time())
+            del self._inflight[key]
+        future.set_result(vector)
+        return vector
+
+    def _lookup(self, texts: list[str]) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        keys = [normalize_query(text) for text in texts]
+        now = time.time()
+        with self._lock:
+            found = {key: vector for key in set(keys) if (vector := self._get(key, now)) is not None}
+            self.hits += sum(key in found for key in keys)
+        return keys, found, list(dict.fromkeys(key for key in keys if key not in found))
+
+    def _store(self, keys: list[str], vectors: list[list[float]]):
+        now = time.time()
+        with self._lock:
+            self.misses += len(keys)
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector, now)
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            vectors = self.inner.embed_batch(missing)
+            self._store(missing, vectors)
+            found.update(zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "entries": len(self._cache), "max_entries": self.max_entries,
+            }
+
+    def _load(self, path: Path):
+        try:
+            with np.load(path) as data:
+                keys, expires, vectors = data["keys"], data["expires"], data["vectors"]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Ignoring query cache {path}: {e}")
+            return
+        now = time.time()
+        for key, expiry, vector in zip(keys.tolist(), expires.tolist(), vectors):
+            if expiry > now:
+                self._cache[key] = (expiry, vector.tolist())
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            items = list(self._cache.items())
+        if not items:
+            return
+        keys = np.array([key for key, _ in items])
+        expires = np.array([expiry for _, (expiry, _) in items], dtype=np.float64)
+        vectors = np.array([vector for _, (_, vector) in items], dtype=np.float32)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=keys, expires=expires, vectors=vectors)
+        os.replace(tmp, self.path)
+
+
+class AsyncCachedEmbedder(CachedEmbedder):
+    inner: AsyncEmbedder
+
+    async def embed(self, text: str) -> list[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._get(key, time.time())
+            if vector is not None:
+                self.hits += 1
+                return vector
+            task = self._inflight.get(key)
+            if task is None:
+                task = self._inflight[key] = asyncio.ensure_future(self._fetch(key))
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        # Shielded so a cancelled request does not cancel the call other requests are waiting on.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str) -> list[float]:
+        try:
+            vector = await self.inner.embed(key)
+            with self._lock:
+                self._put(key, vector, time.time())
+            return vector
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            vectors = await self.inner.embed_batch(missing)
+            self._store(missing, vectors)
+            found.update(zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    async def aclose(self):
+        if hasattr(self.inner, "aclose"):
+            await self.inner.aclose()
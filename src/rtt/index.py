@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from rtt import package, vector
+from rtt.util import rss_mb
+
+VIDEOS_FILE = "videos.json"
+SOURCES_FILE = "sources.json"
+SEGMENT_COLUMNS = [
+    "segment_id", "video_id", "start_seconds", "end_seconds", "transcript_raw", "transcript_enriched",
+    "text_embedding", "frame_path", "collection",
+]
+
+
+def collect_rtt_files(paths: list[Path]) -> list[Path]:
+    result: list[Path] = []
+    for p in paths:
+        if p.is_dir():
+            result.extend(sorted(p.glob("**/*.rtt")))
+        elif p.suffix == ".rtt" and p.exists():
+            result.append(p)
+    return result
+
+
+def load_rtt_file(rtt_path: Path) -> tuple[str, dict, pa.Table] | None:
+    vid, arrow_table = package.load_metadata(rtt_path, columns=SEGMENT_COLUMNS)
+
+    emb_type = arrow_table.schema.field("text_embedding").type
+    if hasattr(emb_type, "list_size") and emb_type.list_size != 768:
+        print(f"Skipping {rtt_path.name}: embeddings have dimension {emb_type.list_size}, expected 768")
+        return None
+    if not hasattr(emb_type, "list_size"):
+        lengths = pc.list_value_length(arrow_table.column("text_embedding"))
+        bad_count = pc.sum(pc.not_equal(lengths, 768)).as_py()
+        if bad_count:
+            print(f"Skipping {rtt_path.name}: {bad_count}/{len(arrow_table)} embeddings have wrong dimensions")
+            return None
+
+    info = {
+        "title": vid.title,
+        "remote_url": vid.source_url or None,
+        "page_url": vid.page_url or None,
+        "collection": vid.collection,
+        "context": vid.context or "",
+        "local_dir": rtt_path.parent,
+    }
+    return vid.video_id, info, arrow_table
+
+
+def load_in_parallel(
+    rtt_files: list[Path], workers: int | None = None,
+) -> Iterator[tuple[Path, tuple[str, dict, pa.Table] | None]]:
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from ((rtt_path, load_rtt_file(rtt_path)) for rtt_path in rtt_files)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rtt-load") as pool:
+        yield from zip(rtt_files, pool.map(load_rtt_file, rtt_files))
+
+
+def load_rtt_files(
+    db: vector.Database, rtt_paths: list[Path], workers: int | None = None,
+) -> tuple[dict[str, dict], dict[str, Path]]:
+    videos: dict[str, dict] = {}
+    rtt_paths_by_video: dict[str, Path] = {}
+
+    t0 = time.monotonic()
+    total_segments = 0
+    rtt_files = collect_rtt_files(rtt_paths)
+    print(f"Found {len(rtt_files)} .rtt files, RSS={rss_mb()}MB")
+    for i, (rtt_path, loaded) in enumerate(load_in_parallel(rtt_files, workers)):
+        if i % 100 == 0:
+            print(f"  loading {i}/{len(rtt_files)} RSS={rss_mb()}MB")
+        if loaded is None:
+            continue
+        video_id, info, arrow_table = loaded
+        videos[video_id] = info
+        rtt_paths_by_video[video_id] = rtt_path
+        db.add_table(arrow_table)
+        total_segments += len(arrow_table)
+
+    t_load = time.monotonic()
+    print(f"Loaded {len(videos)} files, {total_segments} segments in {(t_load - t0) * 1000:.0f}ms, RSS={rss_mb()}MB")
+
+    db._ensure_merged()
+    t_merge = time.monotonic()
+    print(f"Merged search index in {(t_merge - t_load) * 1000:.0f}ms, RSS={rss_mb()}MB")
+    return videos, rtt_paths_by_video
+
+
+def save(
+    index_dir: Path, db: vector.Database, videos: dict[str, dict], rtt_paths_by_video: dict[str, Path],
+    sources: dict[str, dict] | None = None,
+):
+    db.save(index_dir)
+    entries = {
+        vid_id: {**info, "local_dir": str(info["local_dir"]), "rtt_path": str(rtt_paths_by_video[vid_id])}
+        for vid_id, info in videos.items()
+    }
+    _write_json(index_dir / VIDEOS_FILE, entries)
+    if sources is not None:
+        save_sources(index_dir, sources)
+
+
+def save_sources(index_dir: Path, sources: dict[str, dict]):
+    _write_json(index_dir / SOURCES_FILE, sources)
+
+
+def _write_json(path: Path, data):
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(data))
+    tmp.replace(path)
+
+
+def open_videos(index_dir: Path) -> tuple[dict[str, dict], dict[str, Path]]:
+    entries = json.loads((index_dir / VIDEOS_FILE).read_text())
+    videos = {
+        vid_id: {k: v for k, v in info.items() if k != "rtt_path"} | {"local_dir": Path(info["local_dir"])}
+        for vid_id, info in entries.items()
+    }
+    return videos, {vid_id: Path(info["rtt_path"]) for vid_id, info in entries.items()}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build(rtt_paths: list[Path], output: Path, lexical: bool = False) -> bool:
+    t0 = time.monotonic()
+    old_sources = json.loads((output / SOURCES_FILE).read_text()) if (output / SOURCES_FILE).exists() else {}
+    sources: dict[str, dict] = {}
+    changed: list[Path] = []
+    rtt_files = collect_rtt_files(rtt_paths)
+    for rtt_path in rtt_files:
+        key = str(rtt_path.resolve())
+        stat = rtt_path.stat()
+        entry = old_sources.get(key)
+        if entry and (entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+            sources[key] = entry
+        elif entry and entry["sha256"] == _sha256(rtt_path):
+            sources[key] = entry | {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+        else:
+            changed.append(rtt_path)
+    unchanged = len(sources)
+    removed = len(old_sources.keys() - {str(p.resolve()) for p in rtt_files})
+    if not changed and not removed and sources and (output / vector.LEXICAL_DIR).exists() == lexical:
+        if sources != old_sources:
+            save_sources(output, sources)
+        print(f"Index {output} is up to date ({unchanged} files)")
+        return True
+
+    db = vector.Database.memory(lexical=lexical)
+    videos: dict[str, dict] = {}
+    rtt_paths_by_video: dict[str, Path] = {}
+    if sources:
+        # Starting from the saved index keeps its embeddings and keyword postings; only changed files are added.
+        old_videos, old_paths = open_videos(output)
+        kept = [entry["video_id"] for entry in sources.values()]
+        db = vector.Database.open(output, lexical=lexical).updated(sorted(old_videos.keys() - set(kept)))
+        for video_id in kept:
+            videos[video_id] = old_videos[video_id]
+            rtt_paths_by_video[video_id] = old_paths[video_id]
+
+    for i, (rtt_path, loaded) in enumerate(load_in_parallel(changed)):
+        if i % 100 == 0:
+            print(f"  loading {i}/{len(changed)} RSS={rss_mb()}MB")
+        if loaded is None:
+            continue
+        video_id, info, arrow_table = loaded
+        stat = rtt_path.stat()
+        sources[str(rtt_path.resolve())] = {
+            "video_id": video_id, "mtime": stat.st_mtime_ns, "size": stat.st_size, "sha256": _sha256(rtt_path),
+        }
+        videos[video_id] = info
+        rtt_paths_by_video[video_id] = rtt_path
+        db.add_table(arrow_table)
+
+    if db._ensure_merged() is None:
+        print("No segments found.")
+        return False
+    save(output, db, videos, rtt_paths_by_video, sources)
+    print(
+        f"Index {output}: {unchanged} unchanged, {len(changed)} loaded, {removed} removed, "
+        f"{db.count()} segments in {(time.monotonic() - t0) * 1000:.0f}ms, RSS={rss_mb()}MB"
+    )
+    return True
@@ -1,14 +1,56 @@
 import json
+import os
+import struct
+import threading
 import zipfile
+import zlib
+from collections import OrderedDict
 from pathlib import Path
+from typing import Iterable
 
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
 from rtt import types as t, vector
 
+FORMAT_VERSION = 2
+HEADER_FILE = "header.json"
+PAGE_ALIGNMENT = 4096
+ENTRY_ALIGNMENT = 64
+# extra-field id used by Android's zipalign for padding
+_ALIGN_EXTRA_ID = 0xD935
+
+
+def _embedding_column(embeddings: np.ndarray) -> pa.FixedSizeListArray:
+    embeddings = np.asarray(embeddings, dtype=np.float16)
+    return pa.FixedSizeListArray.from_arrays(pa.array(embeddings.ravel()), embeddings.shape[1])
+
+
+def _write_stored(zf: zipfile.ZipFile, name: str, data: bytes, align: int = ENTRY_ALIGNMENT):
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED
+    data_start = zf.fp.tell() + 30 + len(name.encode()) + 4
+    pad = -data_start % align
+    info.extra = struct.pack("<HH", _ALIGN_EXTRA_ID, pad) + b"\0" * pad
+    zf.writestr(info, data)
+
+
+def _write_archive(output_path: Path, manifest: dict, table: pa.Table, extra: Iterable[tuple[str, bytes]]):
+    header = {k: v for k, v in manifest.items() if k != "segments"}
+    pq_buf = pa.BufferOutputStream()
+    pq.write_table(table, pq_buf)
+    with zipfile.ZipFile(output_path, "w") as zf:
+        _write_stored(zf, HEADER_FILE, json.dumps(header).encode())
+        _write_stored(zf, "segments.parquet", pq_buf.getvalue().to_pybytes(), align=PAGE_ALIGNMENT)
+        _write_stored(zf, "manifest.json", json.dumps(manifest, indent=2).encode())
+        for name, data in extra:
+            _write_stored(zf, name, data)
+
 
 def create(video: t.Video, segments: list[t.Segment], frames_dir: Path | None, output_path: Path) -> Path:
+    embeddings = np.array([s.text_embedding for s in segments] or np.empty((0, 768)), dtype=np.float16)
     table = pa.table({
         "segment_id": [s.segment_id for s in segments],
         "video_id": [s.video_id for s in segments],
@@ -16,7 +58,7 @@ def create(video: t.Video, segments: list[t.Segment], frames_dir: Path | None, o
         "end_seconds": [s.end_seconds for s in segments],
         "transcript_raw": [s.transcript_raw for s in segments],
         "transcript_enriched": [s.transcript_enriched for s in segments],
-        "text_embedding": [s.text_embedding for s in segments],
+        "text_embedding": _embedding_column(embeddings),
         "frame_path": [s.frame_path for s in segments],
         "has_speech": [s.has_speech for s in segments],
         "source": [s.source for s in segments],
@@ -24,6 +66,7 @@ def create(video: t.Video, segments: list[t.Segment], frames_dir: Path | None, o
     })
 
     manifest = {
+        "format_version": FORMAT_VERSION,
         "video_id": video.video_id,
         "status": "ready",
         "title": video.title,
@@ -47,31 +90,18 @@ def create(video: t.Video, segments: list[t.Segment], frames_dir: Path | None, o
         ],
     }
 
-    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
-
-        pq_buf = pa.BufferOutputStream()
-        pq.write_table(table, pq_buf)
-        zf.writestr("segments.parquet", pq_buf.getvalue().to_pybytes())
-
-        if frames_dir and frames_dir.exists():
-            for frame in sorted(frames_dir.glob("*.jpg")):
-                zf.write(frame, f"frames/{frame.name}")
-
+    frames = sorted(frames_dir.glob("*.jpg")) if frames_dir and frames_dir.exists() else []
+    _write_archive(output_path, manifest, table, ((f"frames/{f.name}", f.read_bytes()) for f in frames))
     return output_path
 
 
-def load_metadata(rtt_path: Path) -> tuple[t.Video, pa.Table]:
-    with zipfile.ZipFile(rtt_path, "r") as zf:
-        manifest = json.loads(zf.read("manifest.json"))
-        pq_bytes = zf.read("segments.parquet")
-
+def _video(manifest: dict) -> t.Video:
     source_url = manifest.get("source_url", "")
     page_url = manifest.get("page_url", "")
     if not page_url and ("youtube.com/" in source_url or "youtu.be/" in source_url):
         page_url = source_url
 
-    video = t.Video(
+    return t.Video(
         video_id=manifest["video_id"],
         title=manifest["title"],
         source_url=source_url,
@@ -82,31 +112,35 @@ def load_metadata(rtt_path: Path) -> tuple[t.Video, pa.Table]:
         status=manifest["status"],
     )
 
-    buf = pa.py_buffer(pq_bytes)
-    table = pq.read_table(pa.BufferReader(buf))
-    return video, table
+
+def _read_entry(zf: zipfile.ZipFile, rtt_path: Path, name: str) -> pa.Buffer:
+    info = zf.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return pa.py_buffer(zf.read(name))
+    with open(rtt_path, "rb") as f:
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = struct.unpack("<HH", f.read(4))
+    with pa.memory_map(str(rtt_path)) as source:
+        return source.read_at(info.file_size, info.header_offset + 30 + name_len + extra_len)
+
+
+def load_metadata(rtt_path: Path, columns: list[str] | None = None) -> tuple[t.Video, pa.Table]:
+    with zipfile.ZipFile(rtt_path, "r") as zf:
+        header = json.loads(zf.read(HEADER_FILE if HEADER_FILE in zf.namelist() else "manifest.json"))
+        pq_buffer = _read_entry(zf, rtt_path, "segments.parquet")
+
+    parquet = pq.ParquetFile(pa.BufferReader(pq_buffer))
+    if columns is not None:
+        columns = [c for c in columns if c in parquet.schema_arrow.names]
+    return _video(header), parquet.read(columns=columns)
 
 
 def load(rtt_path: Path) -> tuple[t.Video, list[t.Segment], pa.Table]:
     with zipfile.ZipFile(rtt_path, "r") as zf:
         manifest = json.loads(zf.read("manifest.json"))
-        pq_bytes = zf.read("segments.parquet")
+        pq_buffer = _read_entry(zf, rtt_path, "segments.parquet")
 
-    source_url = manifest.get("source_url", "")
-    page_url = manifest.get("page_url", "")
-    if not page_url and ("youtube.com/" in source_url or "youtu.be/" in source_url):
-        page_url = source_url
-
-    video = t.Video(
-        video_id=manifest["video_id"],
-        title=manifest["title"],
-        source_url=source_url,
-        page_url=page_url,
-        collection=manifest.get("collection", ""),
-        context=manifest["context"],
-        duration_seconds=manifest["duration_seconds"],
-        status=manifest["status"],
-    )
+    video = _video(manifest)
 
     segments = [
         t.Segment(
@@ -124,7 +158,149 @@ def load(rtt_path: Path) -> tuple[t.Video, list[t.Segment], pa.Table]:
         for s in manifest["segments"]
     ]
 
-    buf = pa.py_buffer(pq_bytes)
-    table = pq.read_table(pa.BufferReader(buf))
+    table = pq.read_table(pa.BufferReader(pq_buffer))
 
     return video, segments, table
+
+
+def upgrade(rtt_path: Path) -> bool:
+    with zipfile.ZipFile(rtt_path, "r") as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest.get("format_version", 1) >= FORMAT_VERSION:
+            return False
+        table = pq.read_table(pa.BufferReader(zf.read("segments.parquet")))
+        extra = [
+            (name, zf.read(name)) for name in zf.namelist()
+            if name not in (HEADER_FILE, "manifest.json", "segments.parquet")
+        ]
+
+    column = table.column("text_embedding").combine_chunks()
+    if pa.types.is_fixed_size_list(column.type):
+        dim = column.type.list_size
+    else:
+        dims = pc.unique(pc.list_value_length(column)).to_pylist()
+        if len(dims) > 1 or None in dims:
+            raise ValueError(f"{rtt_path.name}: embeddings have mixed dimensions {dims}")
+        dim = dims[0] if dims else 768
+    values = column.flatten().to_numpy(zero_copy_only=False).reshape(len(table), dim)
+    table = table.set_column(
+        table.schema.get_field_index("text_embedding"), "text_embedding", _embedding_column(values),
+    )
+    tmp = rtt_path.with_name(f"{rtt_path.name}.tmp")
+    _write_archive(tmp, {**manifest, "format_version": FORMAT_VERSION}, table, extra)
+    os.replace(tmp, rtt_path)
+    return True
+
+
+class _Archive:
+    def __init__(self, path: Path):
+        with zipfile.ZipFile(path, "r") as zf:
+            self.entries = {info.filename: info for info in zf.infolist()}
+        self.fd = os.open(path, os.O_RDONLY)
+        self.offsets: dict[str, int] = {}
+        self.users = 0
+        self.evicted = False
+
+    def read(self, name: str) -> bytes:
+        info = self.entries[name]
+        offset = self.offsets.get(name)
+        if offset is None:
+            name_len, extra_len = struct.unpack("<HH", os.pread(self.fd, 4, info.header_offset + 26))
+            offset = self.offsets[name] = info.header_offset + 30 + name_len + extra_len
+        data = os.pread(self.fd, info.compress_size, offset)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise zipfile.BadZipFile(f"Unsupported compression {info.compress_type} for {name}")
+        return data
+
+
+class ArchivePool:
+    def __init__(self, max_open: int = 256, cache_bytes: int = 0):
+        self.max_open = max_open
+        self.cache_bytes = cache_bytes
+        self._open: OrderedDict[str, _Archive] = OrderedDict()
+        self._cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._cached_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, key: str) -> _Archive:
+        with self._lock:
+            archive = self._open.get(key)
+            if archive is not None:
+                self._open.move_to_end(key)
+                archive.users += 1
+                return archive
+        opened = _Archive(Path(key))
+        with self._lock:
+            archive = self._open.get(key)
+            if archive is None:
+                archive = self._open[key] = opened
+                while len(self._open) > self.max_open:
+                    self._evict(self._open.popitem(last=False)[1])
+            else:
+                os.close(opened.fd)
+            archive.users += 1
+            return archive
+
+    def _evict(self, archive: _Archive):
+        archive.evicted = True
+        if archive.users == 0:
+            os.close(archive.fd)
+
+    def _uncache(self, entry: tuple[str, str]):
+        self._cached_bytes -= len(self._cache.pop(entry))
+
+    def read(self, rtt_path: Path, name: str) -> bytes:
+        key = os.fspath(rtt_path)
+        if self.cache_bytes:
+            with self._lock:
+                data = self._cache.get((key, name))
+                if data is not None:
+                    self._cache.move_to_end((key, name))
+                    self.hits += 1
+                    return data
+                self.misses += 1
+        archive = self._acquire(key)
+        try:
+            data = archive.read(name)
+        finally:
+            with self._lock:
+                archive.users -= 1
+                if archive.evicted and archive.users == 0:
+                    os.close(archive.fd)
+        if len(data) <= self.cache_bytes:
+            with self._lock:
+                # An archive discarded while we read it may have been replaced on disk.
+                if not archive.evicted and (key, name) not in self._cache:
+                    self._cache[(key, name)] = data
+                    self._cached_bytes += len(data)
+                    while self._cached_bytes > self.cache_bytes:
+                        self._uncache(next(iter(self._cache)))
+                        self.evictions += 1
+        return data
+
+    def discard(self, rtt_path: Path):
+        target = Path(rtt_path).resolve()
+        with self._lock:
+            for key in [k for k in self._open if Path(k).resolve() == target]:
+                self._evict(self._open.pop(key))
+            stale = {key for key in {k for k, _ in self._cache} if Path(key).resolve() == target}
+            for entry in [e for e in self._cache if e[0] in stale]:
+                self._uncache(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._cache), "bytes": self._cached_bytes, "max_bytes": self.cache_bytes,
+                "open_archives": len(self._open),
+            }
+
+    def close(self):
+        with self._lock:
+            while self._open:
+                self._evict(self._open.popitem()[1])
+            self._cache.clear()
+            self._cached_bytes = 0
@@ -1,17 +1,25 @@
+import asyncio
+import contextlib
+import inspect
+import json
+import os
+import threading
 import time
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 import httpx
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter
 
-import pyarrow as pa
-import pyarrow.compute as pc
-
-from rtt import embed, package, vector
+from rtt import embed, index, package, vector
+from rtt.util import MicroBatcher, rss_mb
 
 
 class SegmentResult(BaseModel):
@@ -52,78 +60,266 @@ class CollectionsResponse(BaseModel):
     collections: list[CollectionInfo]
 
 
-def _collect_rtt_files(paths: list[Path]) -> list[Path]:
-    result: list[Path] = []
-    for p in paths:
-        if p.is_dir():
-            result.extend(sorted(p.glob("**/*.rtt")))
-        elif p.suffix == ".rtt" and p.exists():
-            result.append(p)
-    return result
+GRAPH_FILENAME = "segments.hnsw"
+FRAME_CACHE_BYTES = 256 * 2**20
+RESULT_CACHE_SIZE = 1024
+BATCH_WINDOW = 0.005
 
 
-def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = None) -> FastAPI:
-    app = FastAPI(title="RTT Semantic Video Search")
-    db = vector.Database.memory()
-    _embedder = embedder or embed.OllamaEmbedder()
-    videos: dict[str, dict] = {}
-    rtt_paths_by_video: dict[str, Path] = {}
+@dataclass(frozen=True)
+class Snapshot:
+    db: vector.Database
+    videos: dict[str, dict]
+    rtt_paths_by_video: dict[str, Path]
 
-    def _mem_mb() -> int:
-        import resource, sys
-        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-        return rss // 1024 if sys.platform == "linux" else rss // (1024 * 1024)
 
-    t0 = time.monotonic()
-    total_segments = 0
-    if isinstance(rtt_paths, Path):
-        rtt_paths = [rtt_paths]
-    rtt_files = _collect_rtt_files(rtt_paths)
-    print(f"Found {len(rtt_files)} .rtt files, RSS={_mem_mb()}MB")
-    for i, rtt_path in enumerate(rtt_files):
-        if i % 100 == 0:
-            print(f"  loading {i}/{len(rtt_files)} RSS={_mem_mb()}MB")
-        vid, arrow_table = package.load_metadata(rtt_path)
-
-        emb_type = arrow_table.schema.field("text_embedding").type
-        if hasattr(emb_type, "list_size") and emb_type.list_size != 768:
-            print(f"Skipping {rtt_path.name}: embeddings have dimension {emb_type.list_size}, expected 768")
-            continue
-        if not hasattr(emb_type, "list_size"):
-            lengths = pc.list_value_length(arrow_table.column("text_embedding"))
-            bad_count = pc.sum(pc.not_equal(lengths, 768)).as_py()
-            if bad_count:
-                print(f"Skipping {rtt_path.name}: {bad_count}/{len(arrow_table)} embeddings have wrong dimensions")
-                continue
+def _file_state(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
 
-        videos[vid.video_id] = {
-            "title": vid.title,
-            "remote_url": vid.source_url or None,
-            "page_url": vid.page_url or None,
-            "collection": vid.collection,
-            "context": vid.context or "",
-            "local_dir": rtt_path.parent,
+class LiveIndex:
+    def __init__(self, snapshot: Snapshot, archives: package.ArchivePool | None = None):
+        self.snapshot = snapshot
+        self.archives = archives or package.ArchivePool()
+        self._seen = {
+            path.resolve(): _file_state(path) for path in snapshot.rtt_paths_by_video.values()
         }
-        rtt_paths_by_video[vid.video_id] = rtt_path
-        db.add_table(arrow_table)
-        total_segments += len(arrow_table)
+        self._pending: dict[Path, tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def poll(self, rtt_paths: list[Path]) -> bool:
+        current = {}
+        for path in index.collect_rtt_files(rtt_paths):
+            state = _file_state(path)
+            if state is not None:
+                current[path.resolve()] = (path, state)
+        deleted = [key for key in self._seen if key not in current]
+        changed = []
+        for key, (path, state) in current.items():
+            if self._seen.get(key) == state:
+                self._pending.pop(key, None)
+            elif self._pending.get(key) == state:
+                changed.append(key)
+            else:
+                self._pending[key] = state
+        if not deleted and not changed:
+            return False
+
+        t0 = time.monotonic()
+        snap = self.snapshot
+        video_for_path = {path.resolve(): vid for vid, path in snap.rtt_paths_by_video.items()}
+        remove = {video_for_path[key] for key in deleted if key in video_for_path}
+        loaded = []
+        for key in changed:
+            path, state = current[key]
+            self._seen[key] = self._pending.pop(key)
+            try:
+                result = index.load_rtt_file(path)
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            # A replacement that fails to load leaves the video's previous rows in place.
+            if result is not None:
+                loaded.append((path, *result))
+                remove.add(result[0])
+                if key in video_for_path:
+                    remove.add(video_for_path[key])
+        for key in deleted:
+            del self._seen[key]
+        for key in deleted + changed:
+            self.archives.discard(key)
+
+        videos = {vid: info for vid, info in snap.videos.items() if vid not in remove}
+        rtt_paths_by_video = {vid: path for vid, path in snap.rtt_paths_by_video.items() if vid not in remove}
+        for path, video_id, info, _ in loaded:
+            videos[video_id] = info
+            rtt_paths_by_video[video_id] = path
+        db = snap.db.updated(sorted(remove), [table for *_, table in loaded])
+        self.snapshot = Snapshot(db, videos, rtt_paths_by_video)
+        print(
+            f"Reloaded {len(loaded)} changed and {len(deleted)} deleted .rtt files in "
+            f"{(time.monotonic() - t0) * 1000:.0f}ms: {db.count()} segments, RSS={rss_mb()}MB"
+        )
+        return True
+
+    def replacing(self, path: Path) -> bool:
+        # Only the watcher reloads changed files, so without it a file that no longer reads is simply broken.
+        return self._thread is not None and _file_state(path) != self._seen.get(path.resolve())
+
+    def watch(self, rtt_paths: list[Path], interval: float = 2.0):
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll(rtt_paths)
+                except Exception as e:
+                    print(f"Watcher error: {e}")
+
+        self._thread = threading.Thread(target=loop, name="rtt-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self._generation: int | None = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = 0
+
+    def get(self, generation: int, key: tuple) -> bytes | None:
+        if not self.max_entries:
+            return None
+        with self._lock:
+            # Generations only grow, so a request still on an older snapshot never clears newer entries.
+            if self._generation is None or generation > self._generation:
+                if self._generation is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            body = self._entries.get(key) if generation == self._generation else None
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, generation: int, key: tuple, body: bytes):
+        with self._lock:
+            if not self.max_entries or generation != self._generation:
+                return
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries), "max_entries": self.max_entries,
+            }
+
+
+def default_graph_path(rtt_paths: list[Path]) -> Path:
+    first = rtt_paths[0]
+    return (first if first.is_dir() else first.parent) / GRAPH_FILENAME
+
+
+def _report_storage(db: vector.Database):
+    if db.memory_budget is not None and db._store is not None:
+        detail = f" m={db.pq_m}" if db.storage == "pq" else ""
+        print(
+            f"Memory budget {db.memory_budget // 2**20}MB: {db.storage}{detail} embeddings "
+            f"({db._store.nbytes // 2**20}MB), expected recall@10 {db.estimate_recall():.3f}"
+        )
 
-    t_load = time.monotonic()
-    print(f"Loaded {len(videos)} files, {total_segments} segments in {(t_load - t0) * 1000:.0f}ms, RSS={_mem_mb()}MB")
 
-    db._ensure_merged()
-    t_merge = time.monotonic()
-    print(f"Merged search index in {(t_merge - t_load) * 1000:.0f}ms, RSS={_mem_mb()}MB")
+def create_app(
+    rtt_paths: Path | list[Path], embedder: embed.Embedder | embed.AsyncEmbedder | None = None,
+    frame_cache_bytes: int = FRAME_CACHE_BYTES, result_cache_size: int = RESULT_CACHE_SIZE,
+    search_threads: int | None = None, batch_window: float = BATCH_WINDOW, **db_options,
+) -> FastAPI:
+    if isinstance(rtt_paths, Path):
+        rtt_paths = [rtt_paths]
+    if db_options.get("engine") == "hnsw" and db_options.get("graph_path") is None:
+        db_options["graph_path"] = default_graph_path(rtt_paths)
+    db = vector.Database.memory(**db_options)
+    videos, rtt_paths_by_video = index.load_rtt_files(db, rtt_paths)
+    _report_storage(db)
 
     db.compact()
-    print(f"Compacted, RSS={_mem_mb()}MB")
+    print(f"Compacted, RSS={rss_mb()}MB")
+    snapshot = Snapshot(db, videos, rtt_paths_by_video)
+    return _build_app(snapshot, embedder, frame_cache_bytes, result_cache_size, search_threads, batch_window)
+
+
+def open_app(
+    index_dir: Path, embedder: embed.Embedder | embed.AsyncEmbedder | None = None,
+    frame_cache_bytes: int = FRAME_CACHE_BYTES, result_cache_size: int = RESULT_CACHE_SIZE,
+    search_threads: int | None = None, batch_window: float = BATCH_WINDOW, **db_options,
+) -> FastAPI:
+    t0 = time.monotonic()
+    db = vector.Database.open(index_dir, **db_options)
+    videos, rtt_paths_by_video = index.open_videos(index_dir)
+    print(f"Opened {index_dir} ({len(videos)} videos) in {(time.monotonic() - t0) * 1000:.0f}ms, RSS={rss_mb()}MB")
+    _report_storage(db)
+    snapshot = Snapshot(db, videos, rtt_paths_by_video)
+    return _build_app(snapshot, embedder, frame_cache_bytes, result_cache_size, search_threads, batch_window)
+
+
+def query_embedder(
+    max_entries: int = 10_000, ttl: float | None = 7 * 86400, path: Path | None = None,
+    batch_window: float = BATCH_WINDOW,
+) -> embed.AsyncEmbedder:
+    embedder = embed.AsyncOllamaEmbedder()
+    if batch_window:
+        embedder = embed.BatchingEmbedder(embedder, window=batch_window)
+    if not max_entries:
+        return embedder
+    return embed.AsyncCachedEmbedder(embedder, max_entries=max_entries, ttl=ttl, path=path)
+
+
+def app_from_env() -> FastAPI:
+    options = json.loads(os.environ.get("RTT_SERVE_OPTIONS", "{}"))
+    if options.get("graph_path"):
+        options["graph_path"] = Path(options["graph_path"])
+    query_cache = options.pop("query_cache", {})
+    if query_cache.get("path"):
+        query_cache["path"] = Path(query_cache["path"])
+    embedder = query_embedder(**query_cache, batch_window=options.get("batch_window", BATCH_WINDOW))
+    return open_app(Path(os.environ["RTT_SERVE_INDEX"]), embedder=embedder, **options)
+
+
+def _build_app(
+    snapshot: Snapshot, embedder: embed.Embedder | embed.AsyncEmbedder | None = None,
+    frame_cache_bytes: int = FRAME_CACHE_BYTES, result_cache_size: int = RESULT_CACHE_SIZE,
+    search_threads: int | None = None, batch_window: float = BATCH_WINDOW,
+) -> FastAPI:
+    @contextlib.asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        if isinstance(_embedder, embed.CachedEmbedder):
+            _embedder.save()
+        if hasattr(_embedder, "aclose"):
+            await _embedder.aclose()
+        scoring.shutdown(wait=False)
+
+    app = FastAPI(title="RTT Semantic Video Search", lifespan=lifespan)
+    live = app.state.live = LiveIndex(snapshot, package.ArchivePool(cache_bytes=frame_cache_bytes))
+    _embedder = embedder or query_embedder(batch_window=batch_window)
+    # Scoring is CPU-bound, so it gets its own small pool; awaiting the embedder holds no thread at all.
+    scoring = ThreadPoolExecutor(max_workers=search_threads or os.cpu_count() or 1, thread_name_prefix="rtt-search")
+
+    async def embed_query(text: str) -> list[float]:
+        if inspect.iscoroutinefunction(_embedder.embed):
+            return await _embedder.embed(text)
+        return await run_in_threadpool(_embedder.embed, text)
+
+    async def score_batch(items: list[tuple]) -> list[bytes]:
+        return await asyncio.get_running_loop().run_in_executor(scoring, score_many, items)
+
+    score_batcher = MicroBatcher(score_batch, window=batch_window) if batch_window else None
+    results_cache = ResultCache(result_cache_size)
+    results_json = TypeAdapter(list[SegmentResult])
 
     frontend_index = Path(__file__).parent.parent.parent / "frontend" / "index.html"
 
     _http_client = httpx.Client(follow_redirects=True, timeout=30)
     _resolved_urls: dict[str, str] = {}
 
-    def _to_result(r: dict, score: float = 0.0) -> SegmentResult:
+    def _to_result(r: dict, videos: dict[str, dict], score: float = 0.0) -> SegmentResult:
         vid_id = r["video_id"]
         vid_info = videos.get(vid_id, {})
         frame_path = r.get("frame_path", "")
@@ -146,14 +342,17 @@ def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = N
 
     @app.get("/static/frames/{video_id}/{filename}")
     def frame(video_id: str, filename: str):
-        rtt_path = rtt_paths_by_video.get(video_id)
+        rtt_path = live.snapshot.rtt_paths_by_video.get(video_id)
         if not rtt_path:
             raise HTTPException(status_code=404, detail="Video not found")
         try:
-            with zipfile.ZipFile(rtt_path, "r") as zf:
-                data = zf.read(f"frames/{filename}")
-        except KeyError:
+            data = live.archives.read(rtt_path, f"frames/{filename}")
+        except (KeyError, FileNotFoundError):
             raise HTTPException(status_code=404, detail="Frame not found")
+        except zipfile.BadZipFile as e:
+            if live.replacing(rtt_path):
+                raise HTTPException(status_code=503, detail="Archive is being replaced, try again shortly")
+            raise HTTPException(status_code=500, detail=f"Cannot read archive {rtt_path.name}: {e}")
         return Response(
             content=data,
             media_type="image/jpeg",
@@ -162,7 +361,7 @@ def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = N
 
     @app.get("/video/{video_id}/resolve")
     def resolve_video(video_id: str):
-        vid_info = videos.get(video_id)
+        vid_info = live.snapshot.videos.get(video_id)
         if not vid_info:
             raise HTTPException(status_code=404, detail="Video not found")
         if video_id in _resolved_urls:
@@ -180,7 +379,7 @@ def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = N
 
     @app.get("/video/{video_id}")
     def video(video_id: str, request: Request):
-        vid_info = videos.get(video_id)
+        vid_info = live.snapshot.videos.get(video_id)
         if not vid_info:
             raise HTTPException(status_code=404, detail="Video not found")
         local_dir = vid_info["local_dir"]
@@ -212,38 +411,75 @@ def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = N
             return FileResponse(str(frontend_index))
         return JSONResponse({"error": "Frontend not built"}, status_code=404)
 
+    def score_many(items: list[tuple[Snapshot, list[float], int, tuple[str, ...] | None, str | None]]) -> list[bytes]:
+        # Queries against the same snapshot and collections share one matrix multiply, at the largest n asked.
+        groups: dict[tuple, list[int]] = {}
+        for i, (snap, _, _, cols, text) in enumerate(items):
+            groups.setdefault((id(snap), cols, text is not None), []).append(i)
+        bodies = [b""] * len(items)
+        for (_, _, hybrid), rows in groups.items():
+            snap, _, _, cols, _ = items[rows[0]]
+            vecs, n = [items[i][1] for i in rows], max(items[i][2] for i in rows)
+            collections = list(cols) if cols else None
+            if hybrid:
+                found = snap.db.hybrid_batch(vecs, [items[i][4] for i in rows], n=n, collections=collections)
+            else:
+                found = snap.db.closest_batch(vecs, n=n, collections=collections)
+            for i, raw in zip(rows, found):
+                bodies[i] = results_json.dump_json(
+                    [_to_result(r, snap.videos, r.get("_score", r.get("_distance", 0.0))) for r in raw[:items[i][2]]]
+                )
+        return bodies
+
     @app.get("/search", response_model=SearchResponse)
-    def search(
+    async def search(
         q: str = Query(default=""),
         segment_id: str = Query(default=""),
         collections: str = Query(default=""),
         n: int = Query(default=50, ge=1, le=200),
+        mode: str = Query(default="vector", pattern="^(vector|hybrid)$"),
     ):
         col_filter = [c for c in collections.split(",") if c] if collections else None
-
-        if segment_id:
-            seg = db.get_segment(segment_id)
-            if not seg:
-                raise HTTPException(status_code=404, detail="Segment not found")
-            query_vec = seg["text_embedding"]
-            raw = db.closest(query_vec, n=n, collections=col_filter)
-            results = [_to_result(r, r.get("_distance", 0.0)) for r in raw]
-            return SearchResponse(query=f"similar:{segment_id}", results=results)
-
-        if not q.strip():
+        snap = live.snapshot
+        if not segment_id and not q.strip():
             raise HTTPException(status_code=400, detail="Empty query")
-
-        query_vec = _embedder.embed(q)
-        raw = db.closest(query_vec, n=n, collections=col_filter)
-        results = [_to_result(r, r.get("_distance", 0.0)) for r in raw]
-        return SearchResponse(query=q, results=results)
+        if mode == "hybrid" and not snap.db.lexical:
+            raise HTTPException(status_code=400, detail="Hybrid search is off; start the server with --hybrid")
+        query = f"similar:{segment_id}" if segment_id else q
+        cols = tuple(sorted(set(col_filter))) if col_filter else None
+        # Similar-segment lookups have no query text to match, so they always rank by vector alone.
+        text = q if mode == "hybrid" and not segment_id else None
+        if segment_id:
+            key = ("segment", segment_id, n, cols)
+        else:
+            key = ("text", embed.normalize_query(q), n, cols, text is not None)
+        body = results_cache.get(snap.db.generation, key)
+
+        if body is None:
+            if segment_id:
+                seg = snap.db.get_segment(segment_id)
+                if not seg:
+                    raise HTTPException(status_code=404, detail="Segment not found")
+                query_vec = seg["text_embedding"]
+            else:
+                query_vec = await embed_query(q)
+            if score_batcher is not None:
+                body = await score_batcher.submit((snap, query_vec, n, cols, text))
+            else:
+                body = (await score_batch([(snap, query_vec, n, cols, text)]))[0]
+            results_cache.put(snap.db.generation, key, body)
+        return Response(
+            content=b'{"query":' + json.dumps(query).encode() + b',"results":' + body + b"}",
+            media_type="application/json",
+        )
 
     @app.get("/static/video/{video_id}/segments")
     def video_segments(video_id: str):
-        if video_id not in videos:
+        snap = live.snapshot
+        if video_id not in snap.videos:
             raise HTTPException(status_code=404, detail="Video not found")
-        rows = db.video_segments(video_id)
-        results = [_to_result(r) for r in rows]
+        rows = snap.db.video_segments(video_id)
+        results = [_to_result(r, snap.videos) for r in rows]
         return JSONResponse(
             content=[r.model_dump() for r in results],
             headers={"Cache-Control": "public, max-age=31536000, immutable"},
@@ -257,21 +493,36 @@ def create_app(rtt_paths: Path | list[Path], embedder: embed.Embedder | None = N
         collections: str = Query(default=""),
     ):
         col_filter = [c for c in collections.split(",") if c] if collections else None
-        rows = db.list_segments(offset=offset, limit=limit, collections=col_filter)
-        total = db.count(collections=col_filter)
-        results = [_to_result(r) for r in rows]
+        snap = live.snapshot
+        rows = snap.db.list_segments(offset=offset, limit=limit, collections=col_filter)
+        total = snap.db.count(collections=col_filter)
+        results = [_to_result(r, snap.videos) for r in rows]
         return SegmentsResponse(segments=results, total=total, offset=offset, limit=limit)
 
+    @app.get("/stats")
+    def stats():
+        result = {"frame_cache": live.archives.stats(), "result_cache": results_cache.stats()}
+        if isinstance(_embedder, embed.CachedEmbedder):
+            result["query_cache"] = _embedder.stats()
+        embedder = _embedder.inner if isinstance(_embedder, embed.CachedEmbedder) else _embedder
+        if isinstance(embedder, embed.BatchingEmbedder):
+            result["embed_batches"] = embedder.stats()
+        if score_batcher is not None:
+            result["score_batches"] = {"batches": score_batcher.batches, "queries": score_batcher.items}
+        return result
+
     @app.get("/collections", response_model=CollectionsResponse)
     def collections_list():
+        snap = live.snapshot
         col_data: dict[str, dict] = {}
-        for vid_id, info in videos.items():
+        for vid_id, info in snap.videos.items():
             col = info.get("collection", "") or ""
             if col not in col_data:
                 col_data[col] = {"videos": set(), "segment_count": 0}
             col_data[col]["videos"].add(vid_id)
+        segment_counts = snap.db.collection_counts()
         for col in col_data:
-            col_data[col]["segment_count"] = db.count(collections=[col])
+            col_data[col]["segment_count"] = segment_counts.get(col, 0)
         result = [
             CollectionInfo(id=col_id, video_count=len(info["videos"]), segment_count=info["segment_count"])
             for col_id, info in sorted(col_data.items())
@@ -1,9 +1,11 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Any, Callable, Iterable, NewType, Optional, TypeVar, Union
+from typing import Any, Awaitable, Callable, Generic, Iterable, NewType, Optional, TypeVar, Union
 
 Json = NewType('Json', Any)
 
 T = TypeVar('T')
+R = TypeVar('R')
 
 def find(pred: Callable[[T], bool], items: Iterable[T]) -> Optional[T]:
     return next((x for x in items if pred(x)), None)
@@ -53,3 +55,54 @@ class Time:
 
     def __mul__(self, scalar: Union[int, float]) -> 'Time':
         return Time(max(round(self.ms * scalar), 0))
+
+
+def rss_mb() -> int:
+    import resource, sys
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "linux" else rss // (1024 * 1024)
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(self, fn: Callable[[list[T]], Awaitable[list[R]]], window: float = 0.005, max_batch: int = 32):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = self.items = 0
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,5 +1,19 @@
+import copy
+import heapq
+import itertools
+import json
+import math
 import os
 import random
+import re
+import shutil
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Sequence
 
 os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
 os.environ.setdefault("MKL_NUM_THREADS", "1")
@@ -8,19 +22,894 @@ import numpy as np
 import pyarrow as pa
 import pyarrow.compute
 
-from rtt import types as t
+from rtt import runtime, types as t
+
+ENGINES = ("exact", "ivf", "hnsw")
+STORAGES = ("float16", "int8", "pq")
+PQ_SUBSPACES = (96, 64, 48, 32, 24, 16, 8)
+CHUNK = 20_000
+SCAN_BLOCK = 1024
+PAGE = 4096
+EMBEDDINGS_FILE = "embeddings.f16"
+SEGMENTS_FILE = "segments.arrow"
+LEXICAL_DIR = "lexical"
+TEXT_COLUMNS = ("transcript_raw", "transcript_enriched")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+HYBRID_DEPTH = 100
+TOMBSTONE_FRACTION = 0.25
+EXACT_SCAN_ROWS = 10_000
+HNSW_FILTER_VISITS = 20
+
+_generations = itertools.count(1)
+_scratch = threading.local()
+_token = re.compile(r"[^\W_]+")
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, n: int) -> np.ndarray:
+    n = min(n, len(scores))
+    if n >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, n)[:n]
+    return top[np.argsort(-scores[top])]
+
+
+def _top_k_rows(scores: np.ndarray, n: int) -> np.ndarray:
+    n = min(n, scores.shape[1])
+    if n == 0:
+        return np.empty((len(scores), 0), dtype=np.int64)
+    if n < scores.shape[1]:
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    else:
+        top = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _scratch_buffer(rows: int, dim: int) -> np.ndarray:
+    buffer = getattr(_scratch, "buffer", None)
+    if buffer is None or len(buffer) < rows or buffer.shape[1] != dim:
+        buffer = _scratch.buffer = np.empty((max(rows, SCAN_BLOCK), dim), dtype=np.float32)
+    return buffer[:rows]
+
+
+def _split_runs(runs: list[tuple[int, int]], parts: int) -> list[list[tuple[int, int]]]:
+    total = sum(stop - start for start, stop in runs)
+    size = -(-total // parts)
+    shards, shard, left = [], [], size
+    for start, stop in runs:
+        while start < stop:
+            end = min(stop, start + left)
+            shard.append((start, end))
+            left -= end - start
+            start = end
+            if left == 0:
+                shards.append(shard)
+                shard, left = [], size
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def _extend(
+    buffer: np.ndarray, size: int, rows: np.ndarray, axis: int = 0, allocate: Callable = np.empty,
+) -> np.ndarray:
+    used = (slice(None),) * axis + (slice(0, size),)
+    need = size + rows.shape[axis]
+    if need > buffer.shape[axis]:
+        shape = list(buffer.shape)
+        shape[axis] = max(need, 2 * shape[axis])
+        grown = allocate(tuple(shape), dtype=buffer.dtype)
+        grown[used] = buffer[used]
+        buffer = grown
+    buffer[(slice(None),) * axis + (slice(size, need),)] = rows
+    return buffer
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self._tail_rows = np.empty(0, dtype=np.int64)
+        self._tail_lists = np.empty(0, dtype=np.int32)
+        self._tail = 0
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls, embeddings: np.ndarray, nlist: int | None = None,
+        iterations: int = 10, sample: int = 64, seed: int = 0,
+    ) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        count = len(embeddings)
+        nlist = min(nlist or max(1, int(math.sqrt(count))), count)
+        train_idx = rng.choice(count, size=min(count, nlist * sample), replace=False)
+        train = embeddings[np.sort(train_idx)].astype(np.float32)
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            sums[empty] = train[rng.choice(len(train), size=int(empty.sum()))]
+            centroids = _normalize_rows(sums)
+
+        centroids = centroids.astype(np.float32)
+        index = cls(centroids, np.zeros(nlist + 1, dtype=np.int64), np.empty(0, dtype=np.int64))
+        index._layout(np.arange(count, dtype=np.int64), index._assign(embeddings))
+        return index
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(embeddings), dtype=np.int32)
+        for i in range(0, len(embeddings), CHUNK):
+            chunk = embeddings[i:i + CHUNK].astype(np.float32)
+            assign[i:i + CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assign
+
+    def _layout(self, rows: np.ndarray, assign: np.ndarray):
+        order = np.argsort(assign, kind="stable")
+        self.rows = rows[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))])
+
+    def add(self, embeddings: np.ndarray, start: int):
+        rows = np.arange(start, start + len(embeddings), dtype=np.int64)
+        assign = self._assign(embeddings)
+        if self._tail + len(rows) > len(self.rows):
+            lists = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.offsets))
+            self._layout(
+                np.concatenate([self.rows, self._tail_rows[:self._tail], rows]),
+                np.concatenate([lists, self._tail_lists[:self._tail], assign]),
+            )
+            self._tail = 0
+            return
+        self._tail_rows = _extend(self._tail_rows, self._tail, rows)
+        self._tail_lists = _extend(self._tail_lists, self._tail, assign)
+        self._tail += len(rows)
+
+    def reorder(self, perm: np.ndarray) -> "IVFIndex":
+        lists = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.offsets))
+        rows = np.concatenate([self.rows, self._tail_rows[:self._tail]])
+        lists = np.concatenate([lists, self._tail_lists[:self._tail]])
+        keep = perm[rows] >= 0
+        index = IVFIndex(self.centroids, self.offsets, self.rows)
+        index._layout(perm[rows[keep]], lists[keep])
+        return index
+
+    def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.nlist)
+        lists = _top_k(self.centroids @ q, nprobe)
+        found = [self.rows[self.offsets[c]:self.offsets[c + 1]] for c in lists]
+        if self._tail:
+            tail = self._tail_rows[:self._tail]
+            found.append(tail[np.isin(self._tail_lists[:self._tail], lists)])
+        return np.concatenate(found)
+
+
+class Float16Store:
+    exact = True
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self._buffer = vectors
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+    def append(self, vectors: np.ndarray):
+        size = len(self.vectors)
+        self._buffer = _extend(self._buffer, size, vectors)
+        self.vectors = self._buffer[:size + len(vectors)]
+
+    def take(self, rows: np.ndarray) -> "Float16Store":
+        return Float16Store(_take(self.vectors, rows))
+
+    def prepare(self, q: np.ndarray) -> np.ndarray:
+        return q
+
+    def _count(self, rows: slice | np.ndarray) -> int:
+        return len(range(*rows.indices(len(self.vectors)))) if isinstance(rows, slice) else len(rows)
+
+    def _upcast_blocks(self, rows: slice | np.ndarray) -> Iterator[tuple[int, np.ndarray]]:
+        # Upcast SCAN_BLOCK rows at a time into this thread's scratch buffer instead of allocating a float32 copy.
+        start = rows.indices(len(self.vectors))[0] if isinstance(rows, slice) else 0
+        count = self._count(rows)
+        for i in range(0, count, SCAN_BLOCK):
+            j = min(i + SCAN_BLOCK, count)
+            block = _scratch_buffer(j - i, self.vectors.shape[1])
+            np.copyto(block, self.vectors[start + i:start + j] if isinstance(rows, slice) else self.vectors[rows[i:j]])
+            yield i, block
+
+    def score(self, q: np.ndarray, rows: slice | np.ndarray) -> np.ndarray:
+        q = q.astype(np.float32, copy=False)
+        out = np.empty(self._count(rows), dtype=np.float32)
+        for i, block in self._upcast_blocks(rows):
+            np.dot(block, q, out=out[i:i + len(block)])
+        return out
+
+    def score_batch(self, queries: np.ndarray, rows: slice | np.ndarray) -> np.ndarray:
+        queries = queries.astype(np.float32, copy=False)
+        out = np.empty((self._count(rows), len(queries)), dtype=np.float32)
+        for i, block in self._upcast_blocks(rows):
+            np.dot(block, queries.T, out=out[i:i + len(block)])
+        return out.T
+
+
+class Int8Store:
+    exact = False
+
+    def __init__(self, codes: np.ndarray, scale: np.ndarray, offset: np.ndarray):
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+        self._buffer = codes
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    @classmethod
+    def encode(cls, vectors: np.ndarray) -> "Int8Store":
+        lo = np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        hi = np.full(vectors.shape[1], -np.inf, dtype=np.float32)
+        for i in range(0, len(vectors), CHUNK):
+            chunk = vectors[i:i + CHUNK].astype(np.float32)
+            lo = np.minimum(lo, chunk.min(axis=0))
+            hi = np.maximum(hi, chunk.max(axis=0))
+        scale = (hi - lo) / 255
+        scale[scale == 0] = 1
+        offset = lo + 128 * scale
+        return cls(_int8_codes(vectors, scale, offset), scale, offset)
+
+    def append(self, vectors: np.ndarray):
+        size = len(self.codes)
+        self._buffer = _extend(self._buffer, size, _int8_codes(vectors, self.scale, self.offset))
+        self.codes = self._buffer[:size + len(vectors)]
+
+    def take(self, rows: np.ndarray) -> "Int8Store":
+        return Int8Store(self.codes[rows], self.scale, self.offset)
+
+    def prepare(self, q: np.ndarray) -> tuple[np.ndarray, float, float]:
+        weights = q * self.scale
+        peak = np.abs(weights).max()
+        # keep 768 * 128 * |weight| inside int32 accumulation
+        step = peak / 16383 if peak > 0 else 1.0
+        return np.rint(weights / step).astype(np.int16), float(step), float(q @ self.offset)
+
+    def score(self, state: tuple[np.ndarray, float, float], rows: slice | np.ndarray) -> np.ndarray:
+        weights, step, bias = state
+        dots = np.einsum("ij,j->i", self.codes[rows], weights, dtype=np.int32)
+        return (dots * step + bias).astype(np.float32)
+
+
+def _int8_codes(vectors: np.ndarray, scale: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for i in range(0, len(vectors), CHUNK):
+        chunk = vectors[i:i + CHUNK].astype(np.float32)
+        codes[i:i + CHUNK] = np.clip(np.rint((chunk - offset) / scale), -128, 127)
+    return codes
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.stack([np.bincount(assign, weights=x[:, d], minlength=k) for d in range(x.shape[1])], axis=1)
+        empty = counts == 0
+        means = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        centroids = np.where(empty[:, None], x[rng.choice(len(x), size=k)], means)
+    return centroids
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    dist = x @ (-2 * centroids.T)
+    dist += (centroids ** 2).sum(axis=1)
+    return dist.argmin(axis=1)
+
+
+def _pq_codes(vectors: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    m, count, dim = len(codebooks), len(vectors), vectors.shape[1]
+    codes = np.empty((m, count), dtype=np.uint8)
+    for i in range(0, count, CHUNK):
+        chunk = vectors[i:i + CHUNK].astype(np.float32).reshape(-1, m, dim // m)
+        for j in range(m):
+            codes[j, i:i + CHUNK] = _nearest(chunk[:, j], codebooks[j])
+    return codes
+
+
+class PQStore:
+    exact = False
+
+    def __init__(self, codebooks: np.ndarray, codes: np.ndarray):
+        self.codebooks = codebooks
+        self.codes = codes
+        self._buffer = codes
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    @classmethod
+    def encode(
+        cls, vectors: np.ndarray, m: int = 96, sample: int = 20_000, iterations: int = 12, seed: int = 0,
+    ) -> "PQStore":
+        if vectors.shape[1] % m:
+            raise ValueError(f"{vectors.shape[1]} dimensions do not split into {m} subspaces")
+        rng = np.random.default_rng(seed)
+        count, dim = vectors.shape
+        train = vectors[np.sort(rng.choice(count, size=min(count, sample), replace=False))].astype(np.float32)
+        train = train.reshape(len(train), m, dim // m)
+        k = min(256, len(train))
+        codebooks = np.stack([_kmeans(train[:, j], k, iterations, rng) for j in range(m)]).astype(np.float32)
+        return cls(codebooks, _pq_codes(vectors, codebooks))
+
+    def append(self, vectors: np.ndarray):
+        size = self.codes.shape[1]
+        self._buffer = _extend(self._buffer, size, _pq_codes(vectors, self.codebooks), axis=1)
+        self.codes = self._buffer[:, :size + len(vectors)]
+
+    def take(self, rows: np.ndarray) -> "PQStore":
+        return PQStore(self.codebooks, self.codes[:, rows])
+
+    def prepare(self, q: np.ndarray) -> np.ndarray:
+        m = len(self.codebooks)
+        return np.einsum("mkd,md->mk", self.codebooks, q.reshape(m, -1))
+
+    def score(self, table: np.ndarray, rows: slice | np.ndarray) -> np.ndarray:
+        codes = self.codes[:, rows]
+        scores = np.zeros(codes.shape[1], dtype=np.float32)
+        for j, sub in enumerate(table):
+            scores += sub.take(codes[j])
+        return scores
+
+
+def choose_storage(count: int, budget: int, dim: int = 768) -> tuple[str, int]:
+    if count * dim * 2 <= budget:
+        return "float16", 0
+    if count * dim <= budget:
+        return "int8", 0
+    for m in PQ_SUBSPACES:
+        if count * m <= budget:
+            return "pq", m
+    return "pq", PQ_SUBSPACES[-1]
+
+
+def parse_size(text: str) -> int:
+    units = {"": 1, "B": 1, "K": 2**10, "KB": 2**10, "M": 2**20, "MB": 2**20, "G": 2**30, "GB": 2**30}
+    text = text.strip().upper()
+    number = text.rstrip("KMGB")
+    unit = text[len(number):]
+    if unit not in units or not number:
+        raise ValueError(f"Invalid size {text!r}, expected e.g. 512MB or 2GB")
+    return int(float(number) * units[unit])
+
+
+def _disk_array(shape: tuple[int, ...], dtype: np.dtype) -> np.memmap:
+    with tempfile.TemporaryFile(dir=runtime.cache_dir()) as f:
+        return np.memmap(f, dtype=dtype, mode="w+", shape=shape)
+
+
+def _take(vectors: np.ndarray, rows: np.ndarray, allocate: Callable = np.empty) -> np.ndarray:
+    taken = allocate((len(rows),) + vectors.shape[1:], dtype=vectors.dtype)
+    for i in range(0, len(rows), CHUNK):
+        taken[i:i + CHUNK] = vectors[rows[i:i + CHUNK]]
+    return taken
+
+
+def _spill_to_disk(vectors: np.ndarray) -> np.ndarray:
+    spilled = _disk_array(vectors.shape, vectors.dtype)
+    for i in range(0, len(vectors), CHUNK):
+        spilled[i:i + CHUNK] = vectors[i:i + CHUNK]
+    return spilled
+
+
+def _hnsw_levels(count: int, m: int, rng: np.random.Generator) -> np.ndarray:
+    return np.floor(-np.log(1.0 - rng.random(count)) / math.log(m)).astype(np.int8)
+
+
+def _search_layer(
+    vectors: np.ndarray, neighbors: Callable[[int], Sequence[int]], q: np.ndarray,
+    entry: list[int], ef: int, allowed: np.ndarray | None = None, max_visits: int | None = None,
+) -> list[tuple[float, int]]:
+    # With a selective filter `results` may never fill to ef, so the walk gives up (returns []) past max_visits.
+    visited = set(entry)
+    sims = np.asarray(vectors[entry], dtype=np.float32) @ q
+    candidates = [(-float(s), e) for s, e in zip(sims, entry)]
+    heapq.heapify(candidates)
+    results = [(float(s), e) for s, e in zip(sims, entry) if allowed is None or allowed[e]]
+    heapq.heapify(results)
+    while len(results) > ef:
+        heapq.heappop(results)
+    while candidates:
+        neg, node = heapq.heappop(candidates)
+        if len(results) >= ef and -neg < results[0][0]:
+            break
+        fresh = [x for x in neighbors(node) if x not in visited]
+        if not fresh:
+            continue
+        visited.update(fresh)
+        if max_visits is not None and len(visited) > max_visits:
+            return []
+        for s, x in zip((np.asarray(vectors[fresh], dtype=np.float32) @ q).tolist(), fresh):
+            if len(results) < ef or s > results[0][0]:
+                heapq.heappush(candidates, (-s, x))
+                if allowed is None or allowed[x]:
+                    heapq.heappush(results, (s, x))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+    return sorted(results, reverse=True)
+
+
+def _select_neighbors(vectors: np.ndarray, found: list[tuple[float, int]], m: int) -> list[int]:
+    selected: list[int] = []
+    for sim, node in found:
+        if len(selected) >= m:
+            break
+        if selected and (vectors[selected] @ vectors[node]).max() > sim:
+            continue
+        selected.append(node)
+    return selected
+
+
+class HNSWIndex:
+    def __init__(
+        self, levels: np.ndarray, layer0: np.ndarray, upper: list[tuple[np.ndarray, np.ndarray]],
+        entry: int, ids: np.ndarray | None = None,
+    ):
+        self.levels = levels
+        self.layer0 = layer0
+        self.upper = upper
+        self.entry = entry
+        self.ids = ids
+        self._levels = levels
+        self._layer0 = layer0
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, m: int = 16, ef_construction: int = 100, seed: int = 0) -> "HNSWIndex":
+        vectors = embeddings.astype(np.float32)
+        count = len(vectors)
+        levels = _hnsw_levels(count, m, np.random.default_rng(seed))
+        upper = [
+            (nodes := np.flatnonzero(levels >= layer).astype(np.int32), np.full((len(nodes), m), -1, dtype=np.int32))
+            for layer in range(1, int(levels.max()) + 1)
+        ]
+        graph = cls(levels, np.full((count, 2 * m), -1, dtype=np.int32), upper, 0)
+        for node in range(1, count):
+            graph._connect(vectors, node, ef_construction)
+        return graph
+
+    def add(self, vectors: np.ndarray, ef_construction: int = 100, seed: int = 0):
+        start, count = len(self.levels), len(vectors)
+        m = self.layer0.shape[1] // 2
+        self._levels = _extend(self._levels, start, np.zeros(count - start, dtype=self.levels.dtype))
+        self._layer0 = _extend(self._layer0, start, np.full((count - start, 2 * m), -1, dtype=np.int32))
+        self.levels, self.layer0 = self._levels[:count], self._layer0[:count]
+        self.ids = None
+        self._insert(vectors, np.arange(start, count), ef_construction, seed)
+
+    def _insert(self, vectors: np.ndarray, nodes: np.ndarray, ef_construction: int = 100, seed: int = 0):
+        # Links the given unconnected nodes into the graph, in order; they need not be contiguous.
+        if not len(nodes):
+            return
+        m = self.layer0.shape[1] // 2
+        levels = _hnsw_levels(len(nodes), m, np.random.default_rng(seed + int(nodes[0])))
+        self.levels[nodes] = levels
+        for layer in range(1, int(levels.max()) + 1):
+            if layer > len(self.upper):
+                self.upper.append((np.empty(0, dtype=np.int32), np.empty((0, m), dtype=np.int32)))
+            members, links = self.upper[layer - 1]
+            members = np.concatenate([members, nodes[levels >= layer].astype(np.int32)])
+            links = np.concatenate([links, np.full((int((levels >= layer).sum()), m), -1, dtype=np.int32)])
+            order = np.argsort(members, kind="stable")
+            self.upper[layer - 1] = (members[order], links[order])
+        for node in nodes.tolist():
+            self._connect(vectors, node, ef_construction)
+
+    def _connect(self, vectors: np.ndarray, node: int, ef_construction: int):
+        q = np.asarray(vectors[node], dtype=np.float32)
+        level, top = int(self.levels[node]), int(self.levels[self.entry])
+        m = self.layer0.shape[1] // 2
+        ep = [self.entry]
+        for layer in range(top, level, -1):
+            ep = [_search_layer(vectors, self._neighbors(layer), q, ep, 1)[0][1]]
+        for layer in range(min(level, top), -1, -1):
+            neighbors = self._neighbors(layer)
+            found = _search_layer(vectors, neighbors, q, ep, ef_construction)
+            max_links = 2 * m if layer == 0 else m
+            selected = _select_neighbors(vectors, found, m)
+            self._set_links(layer, node, selected)
+            for nb in selected:
+                links = neighbors(nb) + [node]
+                if len(links) > max_links:
+                    sims = np.asarray(vectors[links], dtype=np.float32) @ np.asarray(vectors[nb], dtype=np.float32)
+                    order = np.argsort(-sims)
+                    links = _select_neighbors(vectors, [(float(sims[i]), links[i]) for i in order], max_links)
+                self._set_links(layer, nb, links)
+            ep = [x for _, x in found]
+        if level > top:
+            self.entry = node
+
+    def _set_links(self, layer: int, node: int, links: list[int]):
+        if layer == 0:
+            table, row = self.layer0, node
+        else:
+            nodes, table = self.upper[layer - 1]
+            row = np.searchsorted(nodes, node)
+        table[row] = -1
+        table[row, :len(links)] = links
+
+    def copy(self) -> "HNSWIndex":
+        upper = [(nodes.copy(), links.copy()) for nodes, links in self.upper]
+        return HNSWIndex(self.levels.copy(), self.layer0.copy(), upper, self.entry, self.ids)
+
+    def _neighbors(self, layer: int) -> Callable[[int], list[int]]:
+        if layer == 0:
+            links = self.layer0
+            return lambda node: [x for x in links[node].tolist() if x >= 0]
+        nodes, links = self.upper[layer - 1]
+        return lambda node: [x for x in links[np.searchsorted(nodes, node)].tolist() if x >= 0]
+
+    def search(
+        self, vectors: np.ndarray, q: np.ndarray, n: int, ef: int, allowed: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ep = [self.entry]
+        for layer in range(len(self.upper), 0, -1):
+            ep = [_search_layer(vectors, self._neighbors(layer), q, ep, 1)[0][1]]
+        ef = max(ef, n)
+        max_visits = HNSW_FILTER_VISITS * ef if allowed is not None else None
+        found = _search_layer(vectors, self._neighbors(0), q, ep, ef, allowed, max_visits)[:n]
+        rows = np.array([x for _, x in found], dtype=np.int64)
+        scores = np.array([s for s, _ in found], dtype=np.float32)
+        return rows, scores
+
+    def reorder(self, perm: np.ndarray, count: int | None = None) -> "HNSWIndex | None":
+        # Moves node i to perm[i] in a graph of `count` nodes. Nodes mapped to -1 are dropped along with the
+        # links to them, and nodes nothing maps to are left unconnected for _insert. None if nothing is kept.
+        def remap(links: np.ndarray) -> np.ndarray:
+            return np.where(links >= 0, perm[np.maximum(links, 0)], -1).astype(np.int32)
+
+        count = len(perm) if count is None else count
+        keep = perm >= 0
+        if not keep.any():
+            return None
+        entry = self.entry if keep[self.entry] else int(np.flatnonzero(keep)[np.argmax(self.levels[keep])])
+        levels = np.zeros(count, dtype=self.levels.dtype)
+        levels[perm[keep]] = self.levels[keep]
+        layer0 = np.full((count, self.layer0.shape[1]), -1, dtype=np.int32)
+        layer0[perm[keep]] = remap(self.layer0[keep])
+        upper = []
+        for nodes, links in self.upper[:int(self.levels[entry])]:
+            kept = keep[nodes]
+            new_nodes = perm[nodes[kept]].astype(np.int32)
+            order = np.argsort(new_nodes)
+            upper.append((new_nodes[order], remap(links[kept])[order]))
+        ids = None
+        if self.ids is not None and keep.all() and count == len(perm):
+            ids = np.empty_like(self.ids)
+            ids[perm] = self.ids
+        return HNSWIndex(levels, layer0, upper, int(perm[entry]), ids)
+
+    def save(self, path: Path, ids: Sequence[str]):
+        arrays = {"levels": self.levels, "layer0": self.layer0, "entry": np.array(self.entry), "ids": np.array(ids)}
+        for layer, (nodes, links) in enumerate(self.upper, start=1):
+            arrays[f"nodes_{layer}"] = nodes
+            arrays[f"links_{layer}"] = links
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "HNSWIndex":
+        with np.load(path) as data:
+            upper = []
+            while f"nodes_{len(upper) + 1}" in data:
+                layer = len(upper) + 1
+                upper.append((data[f"nodes_{layer}"], data[f"links_{layer}"]))
+            return cls(data["levels"], data["layer0"], upper, int(data["entry"]), data["ids"])
+
+
+def tokenize(text: str) -> list[str]:
+    return _token.findall(text.lower())
+
+
+def _segment_texts(table: pa.Table) -> Iterator[str]:
+    columns = [table.column(name).to_pylist() for name in TEXT_COLUMNS if name in table.column_names]
+    if not columns:
+        yield from itertools.repeat("", len(table))
+        return
+    for parts in zip(*columns):
+        yield " ".join(part for part in parts if part)
+
+
+def _postings(texts: Iterable[str], terms: dict[str, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    docs, ids, freqs, lengths = array("i"), array("i"), array("i"), array("i")
+    for doc, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, freq in Counter(tokens).items():
+            docs.append(doc)
+            ids.append(terms.setdefault(term, len(terms)))
+            freqs.append(freq)
+    return (
+        np.frombuffer(docs, dtype=np.int32), np.frombuffer(ids, dtype=np.int32),
+        np.minimum(np.frombuffer(freqs, dtype=np.int32), 65535).astype(np.uint16),
+        np.frombuffer(lengths, dtype=np.int32).copy(),
+    )
+
+
+class BM25Index:
+    # Postings are CSR arrays sorted by term id: rows[offsets[t]:offsets[t + 1]] hold the rows containing term t.
+    def __init__(
+        self, terms: dict[str, int], offsets: np.ndarray, rows: np.ndarray, freqs: np.ndarray, lengths: np.ndarray,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.freqs = freqs
+        self.lengths = lengths
+        self.count = len(lengths)
+        self.total = int(lengths.sum())
+        self._tail_rows = np.empty(0, dtype=np.int32)
+        self._tail_terms = np.empty(0, dtype=np.int32)
+        self._tail_freqs = np.empty(0, dtype=np.uint16)
+        self._tail = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.rows.nbytes + self.freqs.nbytes + self.lengths.nbytes
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        terms: dict[str, int] = {}
+        docs, ids, freqs, lengths = _postings(texts, terms)
+        empty = np.empty(0, dtype=np.int32)
+        index = cls(terms, np.zeros(1, dtype=np.int64), empty, empty.astype(np.uint16), lengths)
+        index._layout(docs, ids, freqs)
+        return index
+
+    def _layout(self, rows: np.ndarray, ids: np.ndarray, freqs: np.ndarray):
+        order = np.argsort(ids, kind="stable")
+        self.rows, self.freqs = rows[order], freqs[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(self.terms)))])
+
+    def add(self, texts: Iterable[str], start: int):
+        # Copy the vocabulary so snapshots sharing this index never see terms they have no postings for.
+        self.terms = dict(self.terms)
+        docs, ids, freqs, lengths = _postings(texts, self.terms)
+        rows = docs + np.int32(start)
+        self.lengths = _extend(self.lengths, self.count, lengths)
+        self.count += len(lengths)
+        self.total += int(lengths.sum())
+        if self._tail + len(rows) > len(self.rows):
+            old_rows, old_ids, old_freqs = self._all_postings()
+            self._layout(
+                np.concatenate([old_rows, rows]), np.concatenate([old_ids, ids]), np.concatenate([old_freqs, freqs]),
+            )
+            self._tail = 0
+            return
+        self._tail_rows = _extend(self._tail_rows, self._tail, rows)
+        self._tail_terms = _extend(self._tail_terms, self._tail, ids)
+        self._tail_freqs = _extend(self._tail_freqs, self._tail, freqs)
+        self._tail += len(rows)
+
+    def _all_postings(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ids = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+        return (
+            np.concatenate([self.rows, self._tail_rows[:self._tail]]),
+            np.concatenate([ids, self._tail_terms[:self._tail]]),
+            np.concatenate([self.freqs, self._tail_freqs[:self._tail]]),
+        )
+
+    def reorder(self, perm: np.ndarray, count: int) -> "BM25Index":
+        # Moves row i to perm[i] in an index of `count` rows, dropping rows mapped to -1 and folding in the tail.
+        rows, ids, freqs = self._all_postings()
+        keep = perm[rows] >= 0
+        kept = np.flatnonzero(perm[:self.count] >= 0)
+        lengths = np.zeros(count, dtype=np.int32)
+        lengths[perm[kept]] = self.lengths[kept]
+        index = BM25Index(self.terms, self.offsets, self.rows, self.freqs, lengths)
+        index._layout(perm[rows[keep]].astype(np.int32), ids[keep], freqs[keep])
+        return index
+
+    def _term_postings(self, term: int) -> tuple[np.ndarray, np.ndarray]:
+        rows, freqs = self.rows[:0], self.freqs[:0]
+        if term < len(self.offsets) - 1:
+            start, stop = self.offsets[term], self.offsets[term + 1]
+            rows, freqs = self.rows[start:stop], self.freqs[start:stop]
+        if self._tail:
+            hit = np.flatnonzero(self._tail_terms[:self._tail] == term)
+            rows = np.concatenate([rows, self._tail_rows[hit]])
+            freqs = np.concatenate([freqs, self._tail_freqs[hit]])
+        return rows, freqs
+
+    def search(self, query: str, n: int, runs: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray]:
+        avgdl = self.total / max(self.count, 1)
+        found, weights = [], []
+        for term in dict.fromkeys(tokenize(query)):
+            if term not in self.terms:
+                continue
+            rows, freqs = self._term_postings(self.terms[term])
+            if not len(rows):
+                continue
+            idf = math.log(1 + (self.count - len(rows) + 0.5) / (len(rows) + 0.5))
+            tf = freqs.astype(np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / avgdl)
+            found.append(rows)
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not found or not runs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, weights = np.concatenate(found), np.concatenate(weights)
+        keep = _in_runs(rows, runs)
+        rows, inverse = np.unique(rows[keep], return_inverse=True)
+        scores = np.bincount(inverse, weights=weights[keep]).astype(np.float32)
+        top = _top_k(scores, n)
+        return rows[top].astype(np.int64), scores[top]
+
+    def save(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        index = self.reorder(np.arange(self.count), self.count) if self._tail else self
+        arrays = {"offsets": index.offsets, "rows": index.rows, "freqs": index.freqs, "lengths": index.lengths}
+        for name, values in arrays.items():
+            tmp = directory / f"{name}.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, values)
+            tmp.replace(directory / f"{name}.npy")
+        tmp = directory / "terms.json.tmp"
+        tmp.write_text(json.dumps(list(self.terms)))
+        tmp.replace(directory / "terms.json")
+
+    @classmethod
+    def load(cls, directory: Path) -> "BM25Index":
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in ("offsets", "rows", "freqs", "lengths")
+        }
+        terms = json.loads((directory / "terms.json").read_text())
+        return cls(dict(zip(terms, range(len(terms)))), **arrays)
+
+
+def _in_runs(rows: np.ndarray, runs: list[tuple[int, int]]) -> np.ndarray:
+    starts = np.array([start for start, _ in runs], dtype=np.int64)
+    stops = np.array([stop for _, stop in runs], dtype=np.int64)
+    i = np.searchsorted(starts, rows, side="right") - 1
+    return (i >= 0) & (rows < stops[np.maximum(i, 0)])
+
+
+def _rrf(rankings: list[np.ndarray], n: int, k: int = RRF_K) -> tuple[np.ndarray, np.ndarray]:
+    rows = np.concatenate([np.empty(0, dtype=np.int64)] + rankings)
+    weights = np.concatenate([np.empty(0)] + [1.0 / (k + np.arange(1, len(ranked) + 1)) for ranked in rankings])
+    rows, inverse = np.unique(rows, return_inverse=True)
+    scores = np.bincount(inverse, weights=weights).astype(np.float32)
+    top = _top_k(scores, n)
+    return rows[top], scores[top]
+
+
+def _extend_runs(runs: dict[str, list[tuple[int, int]]], new: dict[str, list[tuple[int, int]]], offset: int):
+    for name, added in new.items():
+        existing = runs.setdefault(name, [])
+        for start, stop in added:
+            if existing and existing[-1][1] == start + offset:
+                existing[-1] = (existing[-1][0], stop + offset)
+            else:
+                existing.append((start + offset, stop + offset))
+
+
+def _subtract_runs(runs: list[tuple[int, int]], removed: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    result = []
+    for start, stop in runs:
+        for a, b in removed:
+            if b <= start or a >= stop:
+                continue
+            if a > start:
+                result.append((start, a))
+            start = max(start, b)
+        if start < stop:
+            result.append((start, stop))
+    return result
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = [
+        table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(len(table), f.type)
+        for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _append_table(table: pa.Table, new: pa.Table) -> pa.Table:
+    batches = table.to_batches() + new.combine_chunks().to_batches()
+    while len(batches) > 1 and 2 * batches[-1].num_rows >= batches[-2].num_rows:
+        batches[-2:] = pa.Table.from_batches(batches[-2:]).combine_chunks().to_batches()
+    return pa.Table.from_batches(batches, schema=table.schema)
+
+
+def _value_runs(column: pa.ChunkedArray) -> dict[str, list[tuple[int, int]]]:
+    encoded = pyarrow.compute.dictionary_encode(pyarrow.compute.fill_null(column, "")).combine_chunks()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    names = encoded.dictionary.to_pylist()
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1])
+    stops = np.append(starts[1:], len(codes))
+    runs: dict[str, list[tuple[int, int]]] = {}
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        runs.setdefault(names[codes[start]], []).append((start, stop))
+    return runs
 
 
 class Database:
-    def __init__(self):
+    def __init__(
+        self, engine: str = "exact", nprobe: int = 8, nlist: int | None = None,
+        ef_search: int = 64, graph_path: Path | None = None, storage: str = "float16", rerank: int = 200,
+        pq_m: int = 96, memory_budget: int | None = None, scan_threads: int = 1, lexical: bool = False,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown search engine {engine!r}, expected one of {ENGINES}")
+        if storage not in STORAGES:
+            raise ValueError(f"Unknown embedding storage {storage!r}, expected one of {STORAGES}")
+        self.engine = engine
+        self.storage = storage
+        self.rerank = rerank
+        self.pq_m = pq_m
+        self.memory_budget = memory_budget
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.scan_threads = scan_threads
+        self.lexical = lexical
+        self._scan_pool: ThreadPoolExecutor | None = None
+        self._scan_workers = 0
+        self._scan_lock = threading.Lock()
+        if scan_threads > 1:
+            self._scan_executor()
+        self._nlist = nlist
+        self._graph_path = graph_path
         self._tables: list[pa.Table] = []
         self._embedding_chunks: list[np.ndarray] = []
         self._merged: pa.Table | None = None
         self._embeddings: np.ndarray | None = None
+        self._embedding_buffer: np.ndarray | None = None
+        self._store: Float16Store | Int8Store | PQStore | None = None
+        self._ivf: IVFIndex | None = None
+        self._hnsw: HNSWIndex | None = None
+        self._lexical: BM25Index | None = None
+        self._collection_runs: dict[str, list[tuple[int, int]]] = {}
+        self._collection_counts: dict[str, int] = {}
+        self._video_runs: dict[str, list[tuple[int, int]]] = {}
+        self._segment_rows: dict[str, int] = {}
+        self._removed = 0
+        self._live_mask: np.ndarray | None = None
+        self.generation = next(_generations)
 
-    def _invalidate(self):
-        self._merged = None
-        self._embeddings = None
+    def _load_or_build_graph(self) -> HNSWIndex:
+        ids = self._merged.column("segment_id").to_pylist()
+        path = self._graph_path
+        if path is not None and path.exists():
+            graph = HNSWIndex.load(path)
+            perm = np.array([self._segment_rows.get(sid, -1) for sid in graph.ids.tolist()], dtype=np.int64)
+            if len(perm) == len(ids) and (perm >= 0).all():
+                return graph.reorder(perm)
+            fresh = np.setdiff1d(np.arange(len(ids)), perm[perm >= 0])
+            updated = graph.reorder(perm, len(ids))
+            if updated is not None:
+                print(
+                    f"Graph {path} is missing {len(fresh)} loaded segments and has "
+                    f"{int((perm < 0).sum())} removed ones, updating it"
+                )
+                updated._insert(self._embeddings, fresh)
+                updated.save(path, ids)
+                return updated
+            print(f"Graph {path} shares no segments with the loaded ones, rebuilding")
+        graph = HNSWIndex.build(self._embeddings)
+        if path is not None:
+            graph.save(path, ids)
+        return graph
 
     def _ensure_merged(self) -> pa.Table | None:
         if self._merged is not None:
@@ -30,18 +919,97 @@ class Database:
         paired = list(zip(self._tables, self._embedding_chunks))
         random.shuffle(paired)
         tables, chunks = zip(*paired)
-        self._merged = pa.concat_tables(tables)
-        self._embeddings = np.concatenate(chunks)
+        merged = pa.concat_tables(tables, promote_options="default")
+        order = pyarrow.compute.sort_indices(merged, sort_keys=[("collection", "ascending")])
+        self._merged = merged.take(order).combine_chunks()
+        self._embeddings = np.concatenate(chunks)[order.to_numpy()]
         emb32 = self._embeddings.astype(np.float32)
         norms = np.linalg.norm(emb32, axis=1, keepdims=True)
         norms = np.where(norms == 0, 1, norms)
         emb32 /= norms
         self._embeddings = emb32.astype(np.float16)
+        del emb32
+        self._build_search()
         return self._merged
 
+    def _build_lookups(self):
+        self._collection_runs = _value_runs(self._merged.column("collection"))
+        self._collection_counts = {
+            name: sum(stop - start for start, stop in runs) for name, runs in self._collection_runs.items()
+        }
+        self._video_runs = _value_runs(self._merged.column("video_id"))
+        ids = self._merged.column("segment_id").to_pylist()
+        self._segment_rows = dict(zip(ids, range(len(ids))))
+
+    def _build_search(self):
+        self._build_lookups()
+        if self.lexical and self._lexical is None:
+            self._lexical = BM25Index.build(_segment_texts(self._merged))
+        if self.memory_budget is not None:
+            self.storage, self.pq_m = choose_storage(len(self._embeddings), self.memory_budget)
+        if self.storage == "int8":
+            self._store = Int8Store.encode(self._embeddings)
+        elif self.storage == "pq":
+            self._store = PQStore.encode(self._embeddings, m=self.pq_m)
+        else:
+            self._store = Float16Store(self._embeddings)
+        if not self._store.exact and not isinstance(self._embeddings, np.memmap):
+            self._embeddings = _spill_to_disk(self._embeddings)
+        self._embedding_buffer = self._embeddings
+        if self.engine == "ivf":
+            self._ivf = IVFIndex.build(self._embeddings, nlist=self._nlist)
+        elif self.engine == "hnsw":
+            self._hnsw = self._load_or_build_graph()
+
+    @classmethod
+    def memory(cls, **kwargs) -> "Database":
+        return cls(**kwargs)
+
     @classmethod
-    def memory(cls) -> "Database":
-        return cls()
+    def open(cls, directory: Path, **kwargs) -> "Database":
+        path = directory / EMBEDDINGS_FILE
+        with open(path, "rb") as f:
+            header = json.loads(f.read(PAGE).rstrip(b"\0"))
+        embeddings = np.memmap(path, dtype=header["dtype"], mode="r", offset=PAGE, shape=tuple(header["shape"]))
+        table = pa.ipc.open_file(pa.memory_map(str(directory / SEGMENTS_FILE))).read_all()
+        db = cls(**kwargs)
+        db._tables, db._embedding_chunks = [table], [embeddings]
+        db._merged, db._embeddings = table, embeddings
+        if db.lexical and (directory / LEXICAL_DIR).exists():
+            lexical = BM25Index.load(directory / LEXICAL_DIR)
+            db._lexical = lexical if lexical.count == len(table) else None
+        saved = db._lexical is not None
+        db._build_search()
+        if db.lexical and not saved:
+            print(f"Built the keyword index for {directory}, saving it")
+            db._lexical.save(directory / LEXICAL_DIR)
+        return db
+
+    def save(self, directory: Path):
+        table = self._ensure_merged()
+        if table is None:
+            raise ValueError("Cannot save an empty database")
+        directory.mkdir(parents=True, exist_ok=True)
+        embeddings, lexical = self._embeddings, self._lexical
+        if self._removed:
+            rows = self._live_rows()
+            table, embeddings = table.take(rows), embeddings[rows]
+            lexical = lexical.reorder(self._row_perm(rows), len(rows)) if lexical is not None else None
+        header = json.dumps({"dtype": str(embeddings.dtype), "shape": list(embeddings.shape)}).encode()
+        tmp = directory / f"{EMBEDDINGS_FILE}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(header.ljust(PAGE, b"\0"))
+            for i in range(0, len(embeddings), CHUNK):
+                f.write(np.ascontiguousarray(embeddings[i:i + CHUNK]).tobytes())
+        tmp.replace(directory / EMBEDDINGS_FILE)
+        tmp = directory / f"{SEGMENTS_FILE}.tmp"
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        tmp.replace(directory / SEGMENTS_FILE)
+        if lexical is not None:
+            lexical.save(directory / LEXICAL_DIR)
+        else:
+            shutil.rmtree(directory / LEXICAL_DIR, ignore_errors=True)
 
     def add(self, segments: list[t.Segment]) -> None:
         if not segments:
@@ -66,16 +1034,292 @@ class Database:
             return
         emb_col = table.column("text_embedding")
         flat = emb_col.combine_chunks().values.to_numpy(zero_copy_only=False)
-        self._embedding_chunks.append(flat.astype(np.float16).reshape(-1, 768))
-        self._tables.append(table.drop("text_embedding"))
-        self._invalidate()
+        self._add_chunk(table.drop("text_embedding"), flat.astype(np.float16).reshape(-1, 768))
+
+    def _add_chunk(self, table: pa.Table, embeddings: np.ndarray) -> None:
+        keys = [("collection", "ascending"), ("video_id", "ascending"), ("start_seconds", "ascending")]
+        order = pyarrow.compute.sort_indices(table, sort_keys=keys)
+        table, embeddings = table.take(order), embeddings[order.to_numpy()]
+        self.generation = next(_generations)
+        if self._merged is None:
+            self._tables.append(table)
+            self._embedding_chunks.append(embeddings)
+        else:
+            self._append(table, embeddings)
+
+    def _append(self, table: pa.Table, embeddings: np.ndarray) -> None:
+        start = len(self._embeddings)
+        embeddings = _normalize_rows(embeddings.astype(np.float32)).astype(np.float16)
+        self._store.append(embeddings)
+        if self._store.exact:
+            self._embeddings = self._store.vectors
+        else:
+            self._embedding_buffer = _extend(self._embedding_buffer, start, embeddings, allocate=_disk_array)
+            self._embeddings = self._embedding_buffer[:start + len(embeddings)]
+        self._merged = _append_table(self._merged, _conform(table, self._merged.schema))
+        collections = _value_runs(table.column("collection"))
+        _extend_runs(self._collection_runs, collections, start)
+        for name, runs in collections.items():
+            self._collection_counts[name] = self._collection_counts.get(name, 0) + sum(b - a for a, b in runs)
+        _extend_runs(self._video_runs, _value_runs(table.column("video_id")), start)
+        self._segment_rows.update(zip(table.column("segment_id").to_pylist(), range(start, len(self._embeddings))))
+        self._live_mask = None
+        if self._lexical is not None:
+            self._lexical.add(_segment_texts(table), start)
+        if self._ivf is not None:
+            self._ivf.add(embeddings, start)
+        elif self._hnsw is not None:
+            self._hnsw.add(self._embeddings)
+
+    def _remove_videos(self, video_ids: Sequence[str]) -> None:
+        removed = sorted(run for v in video_ids for run in self._video_runs.pop(v, []))
+        if not removed:
+            return
+        self.generation = next(_generations)
+        ids = self._merged.column("segment_id")
+        for start, stop in removed:
+            for sid in ids.slice(start, stop - start).to_pylist():
+                if start <= self._segment_rows.get(sid, -1) < stop:
+                    del self._segment_rows[sid]
+        for name in list(self._collection_runs):
+            runs = _subtract_runs(self._collection_runs[name], removed)
+            if runs:
+                self._collection_runs[name] = runs
+                self._collection_counts[name] = sum(stop - start for start, stop in runs)
+            else:
+                del self._collection_runs[name], self._collection_counts[name]
+        self._removed += sum(stop - start for start, stop in removed)
+        self._live_mask = None
+
+    def updated(self, remove_videos: Sequence[str] = (), tables: Sequence[pa.Table] = ()) -> "Database":
+        self._ensure_merged()
+        db = copy.copy(self)
+        db._tables, db._embedding_chunks = [], []
+        db._collection_runs = {name: list(runs) for name, runs in self._collection_runs.items()}
+        db._video_runs = {name: list(runs) for name, runs in self._video_runs.items()}
+        db._collection_counts = dict(self._collection_counts)
+        db._segment_rows = dict(self._segment_rows)
+        db._store = copy.copy(self._store)
+        db._ivf = copy.copy(self._ivf)
+        db._hnsw = self._hnsw.copy() if self._hnsw is not None and tables else self._hnsw
+        db._lexical = copy.copy(self._lexical)
+        if db._merged is not None:
+            db._remove_videos(remove_videos)
+            if db._removed > TOMBSTONE_FRACTION * len(db._embeddings):
+                db._compact_removed()
+        for table in tables:
+            db.add_table(table)
+        return db
+
+    def _compact_removed(self):
+        rows = self._live_rows()
+        if not len(rows):
+            return
+        perm = self._row_perm(rows)
+        self._merged = self._merged.take(rows)
+        self._store = self._store.take(rows)
+        if self._store.exact:
+            self._embeddings = self._store.vectors
+        else:
+            self._embeddings = _take(self._embeddings, rows, allocate=_disk_array)
+        self._embedding_buffer = self._embeddings
+        if self._lexical is not None:
+            self._lexical = self._lexical.reorder(perm, len(rows))
+        if self._ivf is not None:
+            self._ivf = self._ivf.reorder(perm)
+        if self._hnsw is not None:
+            self._hnsw = self._hnsw.reorder(perm, len(rows))
+        self._removed = 0
+        self._live_mask = None
+        self._build_lookups()
 
     def merge(self, other: "Database") -> None:
         other._ensure_merged()
         if other._merged is not None and other._embeddings is not None:
-            self._tables.append(other._merged)
-            self._embedding_chunks.append(other._embeddings)
-            self._invalidate()
+            self._add_chunk(other._merged, other._embeddings)
+
+    def _selected_runs(self, collections: list[str]) -> list[tuple[int, int]]:
+        return sorted(run for c in dict.fromkeys(collections) for run in self._collection_runs.get(c, []))
+
+    def _live_runs(self) -> list[tuple[int, int]]:
+        if not self._removed:
+            return [(0, len(self._embeddings))]
+        return self._selected_runs(list(self._collection_runs))
+
+    def _live_rows(self) -> np.ndarray:
+        runs = self._live_runs()
+        return np.concatenate([np.arange(start, stop) for start, stop in runs]) if runs else np.empty(0, dtype=np.int64)
+
+    def _row_perm(self, rows: np.ndarray) -> np.ndarray:
+        perm = np.full(len(self._embeddings), -1, dtype=np.int64)
+        perm[rows] = np.arange(len(rows))
+        return perm
+
+    def _runs_mask(self, runs: list[tuple[int, int]]) -> np.ndarray:
+        mask = np.zeros(len(self._embeddings), dtype=bool)
+        for start, stop in runs:
+            mask[start:stop] = True
+        return mask
+
+    def estimate_recall(self, k: int = 10, queries: int = 100, sample: int = 20_000, seed: int = 0) -> float:
+        if self._ensure_merged() is None:
+            return 1.0
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(self._embeddings), size=min(sample, len(self._embeddings)), replace=False))
+        vectors = self._embeddings[rows].astype(np.float32)
+        k = min(k, len(rows))
+        hits = 0
+        for qi in rng.choice(len(rows), size=min(queries, len(rows)), replace=False):
+            q = vectors[qi] + 0.01 * rng.standard_normal(vectors.shape[1]).astype(np.float32)
+            q /= np.linalg.norm(q)
+            truth = set(rows[_top_k(vectors @ q, k)].tolist())
+            found, _ = self._select(q, rows, self._store.score(self._store.prepare(q), rows), k)
+            hits += len(truth & set(found.tolist()))
+        return hits / (k * min(queries, len(rows)))
+
+    def _select(self, q: np.ndarray, rows: np.ndarray, scores: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+        if self._store.exact:
+            top = _top_k(scores, n)
+            return rows[top], scores[top]
+        top = _top_k(scores, max(n, self.rerank))
+        top = top[scores[top] > -np.inf]
+        candidates = np.sort(rows[top])
+        exact = self._embeddings[candidates].astype(np.float32) @ q
+        best = _top_k(exact, n)
+        return candidates[best], exact[best]
+
+    def _shards(self, runs: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+        rows = sum(stop - start for start, stop in runs)
+        parts = min(self.scan_threads, -(-rows // CHUNK))
+        if parts <= 1:
+            return [runs]
+        return _split_runs(runs, parts)
+
+    def _scan_executor(self) -> ThreadPoolExecutor:
+        # Created with the database, so snapshots from updated() share one pool; only a scan_threads change replaces it.
+        with self._scan_lock:
+            if self._scan_workers != self.scan_threads:
+                if self._scan_pool is not None:
+                    self._scan_pool.shutdown(wait=False)
+                self._scan_pool = ThreadPoolExecutor(max_workers=self.scan_threads, thread_name_prefix="rtt-scan")
+                self._scan_workers = self.scan_threads
+            return self._scan_pool
+
+    def _scan_shard(self, state, runs: list[tuple[int, int]], m: int) -> tuple[np.ndarray, np.ndarray]:
+        # Keep a running top-m across chunks, so memory is O(m + CHUNK) rather than O(rows scanned).
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start, stop in runs:
+            for i in range(start, stop, CHUNK):
+                j = min(i + CHUNK, stop)
+                chunk = self._store.score(state, slice(i, j))
+                top = _top_k(chunk, m)
+                rows = np.concatenate([best_rows, top + i])
+                scores = np.concatenate([best_scores, chunk[top]])
+                keep = _top_k(scores, m)
+                best_rows, best_scores = rows[keep], scores[keep]
+        return best_rows, best_scores
+
+    def _closest_exact(self, q: np.ndarray, n: int, runs: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray]:
+        state = self._store.prepare(q)
+        m = n if self._store.exact else max(n, self.rerank)
+        shards = self._shards(runs)
+        if len(shards) == 1:
+            rows, scores = self._scan_shard(state, runs, m)
+        else:
+            found = self._scan_executor().map(lambda shard: self._scan_shard(state, shard, m), shards)
+            merged = heapq.merge(*[zip((-scores).tolist(), rows.tolist()) for rows, scores in found])
+            best = list(itertools.islice(merged, m))
+            scores = -np.array([score for score, _ in best], dtype=np.float32)
+            rows = np.array([row for _, row in best], dtype=np.int64)
+        return self._select(q, rows, scores, n)
+
+    def _closest_ivf(self, q: np.ndarray, n: int, mask: np.ndarray | None) -> tuple[np.ndarray, np.ndarray] | None:
+        rows = self._ivf.candidates(q, self.nprobe)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if len(rows) < n:
+            return None
+        scores = self._store.score(self._store.prepare(q), rows)
+        return self._select(q, rows, scores, n)
+
+    def _closest_hnsw(self, q: np.ndarray, n: int, mask: np.ndarray | None) -> tuple[np.ndarray, np.ndarray] | None:
+        rows, scores = self._hnsw.search(self._embeddings, q, n, self.ef_search, mask)
+        if len(rows) < min(n, len(self._embeddings)):
+            return None
+        return rows, scores
+
+    def _closest_exact_many(
+        self, queries: np.ndarray, n: int, runs: list[tuple[int, int]],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        shards = self._shards(runs)
+        if len(shards) == 1:
+            return self._scan_shard_many(queries, n, runs)
+        found = list(self._scan_executor().map(lambda shard: self._scan_shard_many(queries, n, shard), shards))
+        rows = np.concatenate([rows for rows, _ in found], axis=1)
+        scores = np.concatenate([scores for _, scores in found], axis=1)
+        keep = _top_k_rows(scores, n)
+        return np.take_along_axis(rows, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+
+    def _scan_shard_many(
+        self, queries: np.ndarray, n: int, runs: list[tuple[int, int]],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start, stop in runs:
+            for i in range(start, stop, CHUNK):
+                j = min(i + CHUNK, stop)
+                block = self._store.score_batch(queries, slice(i, j))
+                top = _top_k_rows(block, n)
+                rows = np.concatenate([best_rows, top + i], axis=1)
+                scores = np.concatenate([best_scores, np.take_along_axis(block, top, axis=1)], axis=1)
+                keep = _top_k_rows(scores, n)
+                best_rows = np.take_along_axis(rows, keep, axis=1)
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+        return best_rows, best_scores
+
+    def _query_runs(self, collections: list[str] | None) -> tuple[list[tuple[int, int]], np.ndarray | None]:
+        runs = self._selected_runs(collections) if collections else self._live_runs()
+        mask = None
+        if runs and collections and self.engine != "exact":
+            mask = self._runs_mask(runs)
+        elif runs and self._removed and self.engine != "exact":
+            if self._live_mask is None:
+                self._live_mask = self._runs_mask(runs)
+            mask = self._live_mask
+        return runs, mask
+
+    def _results(
+        self, table: pa.Table, found: list[tuple[np.ndarray, np.ndarray]], distances: bool = True,
+    ) -> list[list[dict]]:
+        found = [(rows[scores > -np.inf], scores[scores > -np.inf]) for rows, scores in found]
+        if not found:
+            return []
+        rows = table.take(np.concatenate([rows for rows, _ in found])).to_pylist()
+        results, pos = [], 0
+        for _, scores in found:
+            chunk = rows[pos:pos + len(scores)]
+            for row, score in zip(chunk, scores.tolist()):
+                if distances:
+                    row["_distance"] = 1.0 - score
+                else:
+                    row["_score"] = score
+            results.append(chunk)
+            pos += len(scores)
+        return results
+
+    def _closest_one(
+        self, q: np.ndarray, n: int, runs: list[tuple[int, int]], mask: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # A small filtered selection is cheaper to scan exactly than to reach through the index.
+        if mask is not None and sum(stop - start for start, stop in runs) <= EXACT_SCAN_ROWS:
+            return self._closest_exact(q, n, runs)
+        found = None
+        if self._ivf is not None:
+            found = self._closest_ivf(q, n, mask)
+        elif self._hnsw is not None:
+            found = self._closest_hnsw(q, n, mask)
+        return found or self._closest_exact(q, n, runs)
 
     def closest(self, query_embedding: list[float], n: int = 10, collections: list[str] | None = None) -> list[dict]:
         table = self._ensure_merged()
@@ -86,39 +1330,93 @@ class Database:
         if q_norm == 0:
             return []
         q = q / q_norm
-        scores = np.empty(len(self._embeddings), dtype=np.float32)
-        CHUNK = 20_000
-        for i in range(0, len(self._embeddings), CHUNK):
-            chunk = self._embeddings[i:i + CHUNK].astype(np.float32)
-            scores[i:i + CHUNK] = chunk @ q
+        runs, mask = self._query_runs(collections)
+        if not runs:
+            return []
+        return self._results(table, [self._closest_one(q, n, runs, mask)])[0]
 
-        if collections:
-            col = table.column("collection")
-            mask = None
-            for c in collections:
-                m = pyarrow.compute.equal(col, c)
-                mask = m if mask is None else pyarrow.compute.or_(mask, m)
-            filter_np = mask.combine_chunks().to_numpy(zero_copy_only=False)
-            scores[~filter_np] = -np.inf
-
-        n = min(n, len(scores))
-        if n >= len(scores):
-            top_idx = np.argsort(-scores)
+    def closest_many(
+        self, queries: np.ndarray, n: int = 10, collections: list[str] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32)
+        rows = np.full((len(queries), n), -1, dtype=np.int64)
+        scores = np.full((len(queries), n), -np.inf, dtype=np.float32)
+        if self._ensure_merged() is None or not len(queries):
+            return rows, scores
+        norms = np.linalg.norm(queries, axis=1)
+        valid = np.flatnonzero(norms > 0)
+        runs, mask = self._query_runs(collections)
+        if not runs or not len(valid):
+            return rows, scores
+        normalized = queries[valid] / norms[valid, None]
+        if self.engine == "exact" and self._store.exact:
+            found_rows, found_scores = self._closest_exact_many(normalized, n, runs)
+            rows[valid, :found_rows.shape[1]] = found_rows
+            scores[valid, :found_scores.shape[1]] = found_scores
         else:
-            top_idx = np.argpartition(-scores, n)[:n]
-            top_idx = top_idx[np.argsort(-scores[top_idx])]
+            for i, q in zip(valid.tolist(), normalized):
+                found_rows, found_scores = self._closest_one(q, n, runs, mask)
+                rows[i, :len(found_rows)] = found_rows
+                scores[i, :len(found_scores)] = found_scores
+        rows[scores == -np.inf] = -1
+        return rows, scores
 
-        names = [f.name for f in table.schema if f.name != "text_embedding"]
-        results = []
-        for idx in top_idx:
-            if scores[idx] == -np.inf:
-                break
-            row = {name: table.column(name)[int(idx)].as_py() for name in names}
-            row["_distance"] = 1.0 - float(scores[idx])
-            results.append(row)
-        return results
+    def closest_batch(
+        self, query_embeddings: Sequence[list[float]], n: int = 10, collections: list[str] | None = None,
+    ) -> list[list[dict]]:
+        table = self._ensure_merged()
+        if table is None or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+        rows, scores = self.closest_many(np.array(query_embeddings, dtype=np.float32), n=n, collections=collections)
+        return self._results(table, list(zip(rows, scores)))
+
+    def _require_lexical(self):
+        if not self.lexical:
+            raise ValueError("Keyword search is off; create the Database with lexical=True")
+
+    def search_text(self, query: str, n: int = 10, collections: list[str] | None = None) -> list[dict]:
+        self._require_lexical()
+        table = self._ensure_merged()
+        if table is None:
+            return []
+        runs = self._selected_runs(collections) if collections else self._live_runs()
+        return self._results(table, [self._lexical.search(query, n, runs)], distances=False)[0]
+
+    def hybrid(
+        self, query_embedding: list[float], query: str, n: int = 10, collections: list[str] | None = None,
+    ) -> list[dict]:
+        return self.hybrid_batch([query_embedding], [query], n=n, collections=collections)[0]
+
+    def hybrid_batch(
+        self, query_embeddings: Sequence[list[float]], queries: Sequence[str], n: int = 10,
+        collections: list[str] | None = None, depth: int = HYBRID_DEPTH, k: int = RRF_K,
+    ) -> list[list[dict]]:
+        # Reciprocal-rank fusion of the top `depth` vector and BM25 hits; the fused score is sum(1 / (k + rank)).
+        self._require_lexical()
+        table = self._ensure_merged()
+        if table is None or not len(queries):
+            return [[] for _ in queries]
+        depth = max(n, depth)
+        embeddings = np.array(query_embeddings, dtype=np.float32)
+        vector_rows, _ = self.closest_many(embeddings, n=depth, collections=collections)
+        runs = self._selected_runs(collections) if collections else self._live_runs()
+        lexical = self._lexical
+        found = []
+        for rows, query in zip(vector_rows, queries):
+            text_rows, _ = lexical.search(query, depth, runs)
+            found.append(_rrf([rows[rows >= 0], text_rows], n, k))
+        return self._results(table, found, distances=False)
+
+    def segment_ids(self, rows: np.ndarray) -> np.ndarray:
+        table = self._ensure_merged()
+        ids = np.full(rows.shape, None, dtype=object)
+        valid = rows >= 0
+        if table is not None and valid.any():
+            ids[valid] = table.column("segment_id").take(rows[valid]).to_numpy(zero_copy_only=False)
+        return ids
 
     def compact(self):
+        self._ensure_merged()
         self._tables.clear()
         self._embedding_chunks.clear()
 
@@ -126,11 +1424,10 @@ class Database:
         table = self._ensure_merged()
         if table is None:
             return None
-        col = table.column("segment_id")
-        idx = pyarrow.compute.index(col, segment_id).as_py()
-        if idx < 0:
+        idx = self._segment_rows.get(segment_id)
+        if idx is None:
             return None
-        row = {name: table.column(name)[idx].as_py() for name in table.schema.names}
+        row = table.slice(idx, 1).to_pylist()[0]
         if self._embeddings is not None:
             row["text_embedding"] = self._embeddings[idx].tolist()
         return row
@@ -139,45 +1436,42 @@ class Database:
         table = self._ensure_merged()
         if table is None:
             return []
-        if collections:
-            col = table.column("collection")
-            mask = None
-            for c in collections:
-                m = pyarrow.compute.equal(col, c)
-                mask = m if mask is None else pyarrow.compute.or_(mask, m)
-            table = table.filter(mask)
-        table = table.slice(offset, limit)
-        names = table.schema.names
-        return [
-            {name: table.column(name)[i].as_py() for name in names}
-            for i in range(table.num_rows)
-        ]
+        if not collections and not self._removed:
+            return table.slice(offset, limit).to_pylist()
+        rows = []
+        for start, stop in self._selected_runs(collections) if collections else self._live_runs():
+            if offset >= stop - start:
+                offset -= stop - start
+                continue
+            take = min(limit - len(rows), stop - start - offset)
+            rows.extend(range(start + offset, start + offset + take))
+            offset = 0
+            if len(rows) >= limit:
+                break
+        return table.take(pa.array(rows, type=pa.int64())).to_pylist()
 
     def video_segments(self, video_id: str) -> list[dict]:
         table = self._ensure_merged()
         if table is None:
             return []
-        mask = pyarrow.compute.equal(table.column("video_id"), video_id)
-        filtered = table.filter(mask)
-        if filtered.num_rows == 0:
-            return []
-        indices = pyarrow.compute.sort_indices(filtered.column("start_seconds"))
-        filtered = filtered.take(indices)
-        names = [f.name for f in filtered.schema if f.name != "text_embedding"]
-        return [
-            {name: filtered.column(name)[i].as_py() for name in names}
-            for i in range(filtered.num_rows)
-        ]
+        runs = self._video_runs.get(video_id, [])
+        if len(runs) == 1:
+            start, stop = runs[0]
+            rows = table.slice(start, stop - start)
+        else:
+            rows = table.take(pa.array([i for start, stop in runs for i in range(start, stop)], type=pa.int64()))
+        if (np.diff(rows.column("start_seconds").to_numpy()) < 0).any():
+            rows = rows.take(pyarrow.compute.sort_indices(rows.column("start_seconds")))
+        return rows.to_pylist()
 
     def count(self, collections: list[str] | None = None) -> int:
         table = self._ensure_merged()
         if table is None:
             return 0
         if collections:
-            col = table.column("collection")
-            mask = None
-            for c in collections:
-                m = pyarrow.compute.equal(col, c)
-                mask = m if mask is None else pyarrow.compute.or_(mask, m)
-            table = table.filter(mask)
-        return table.num_rows
+            return sum(self._collection_counts.get(c, 0) for c in dict.fromkeys(collections))
+        return table.num_rows - self._removed
+
+    def collection_counts(self) -> dict[str, int]:
+        self._ensure_merged()
+        return dict(self._collection_counts)
@@ -1,4 +1,7 @@
+import asyncio
 import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from rtt import embed
 
@@ -27,3 +30,109 @@ def test_embedding_shape_and_cosine_ordering():
         assert all(math.isfinite(x) for x in v)
 
     assert cosine(a, b) > cosine(a, c)
+
+
+class CountingEmbedder:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: list[list[str]] = []
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        time.sleep(self.delay)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_cached_embedder_normalizes_expires_and_evicts(monkeypatch):
+    inner = CountingEmbedder()
+    cached = embed.CachedEmbedder(inner, max_entries=2, ttl=60)
+    assert cached.embed("Atomic  Bomb ") == cached.embed("atomic bomb") == [11.0, 1.0]
+    assert inner.calls == [["atomic bomb"]]
+
+    cached.embed("cake")
+    cached.embed("drill")
+    cached.embed("atomic bomb")
+    assert len(inner.calls) == 4
+
+    now = time.time()
+    monkeypatch.setattr(embed.time, "time", lambda: now + 61)
+    cached.embed("atomic bomb")
+    assert len(inner.calls) == 5
+
+    assert cached.embed_batch(["Cake", "atomic bomb", "cake", "drill"]) == [[4.0, 1.0], [11.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert inner.calls[-1] == ["cake", "drill"]
+    assert cached.stats()["entries"] == 2
+
+
+def test_cached_embedder_coalesces_concurrent_queries():
+    inner = CountingEmbedder(delay=0.2)
+    cached = embed.CachedEmbedder(inner)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(cached.embed, ["duck and cover"] * 8))
+    assert all(v == vectors[0] for v in vectors)
+    assert inner.calls == [["duck and cover"]]
+    stats = cached.stats()
+    assert stats["misses"] == 1 and stats["hits"] + stats["coalesced"] == 7
+
+
+def test_cached_embedder_persists_to_disk(tmp_path):
+    path = tmp_path / "queries.npz"
+    cached = embed.CachedEmbedder(CountingEmbedder(), path=path)
+    cached.embed("duck and cover")
+    cached.save()
+
+    inner = CountingEmbedder()
+    reloaded = embed.CachedEmbedder(inner, path=path)
+    assert reloaded.embed("Duck and cover") == [14.0, 1.0]
+    assert inner.calls == []
+
+
+class AsyncCountingEmbedder:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: list[list[str]] = []
+
+    async def embed(self, text: str) -> list[float]:
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        await asyncio.sleep(self.delay)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+async def test_async_cached_embedder_coalesces_and_survives_cancellation():
+    inner = AsyncCountingEmbedder(delay=0.1)
+    cached = embed.AsyncCachedEmbedder(inner)
+    assert isinstance(cached, embed.AsyncEmbedder)
+    first = asyncio.ensure_future(cached.embed("Duck and cover"))
+    await asyncio.sleep(0)
+    rest = [asyncio.ensure_future(cached.embed("duck and  cover")) for _ in range(7)]
+    first.cancel()
+    assert await asyncio.gather(*rest) == [[14.0, 1.0]] * 7
+    assert inner.calls == [["duck and cover"]]
+    assert await cached.embed("duck and cover") == [14.0, 1.0]
+    assert await cached.embed_batch(["cake", "Duck and cover"]) == [[4.0, 1.0], [14.0, 1.0]]
+    assert inner.calls[-1] == ["cake"]
+    stats = cached.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (2, 7, 2)
+
+
+async def test_batching_embedder_gathers_concurrent_queries():
+    inner = AsyncCountingEmbedder()
+    batching = embed.BatchingEmbedder(inner, window=0.05, max_batch=4)
+    vectors = await asyncio.gather(*[batching.embed("x" * i) for i in range(1, 7)])
+    assert vectors == [[float(i), 1.0] for i in range(1, 7)]
+    assert inner.calls == [["x", "xx", "xxx", "xxxx"], ["xxxxx", "xxxxxx"]]
+    assert batching.stats() == {"batches": 2, "queries": 6}
+
+    class Failing(AsyncCountingEmbedder):
+        async def embed_batch(self, texts):
+            raise RuntimeError("ollama down")
+
+    failing = embed.BatchingEmbedder(Failing(), window=0.01)
+    results = await asyncio.gather(failing.embed("a"), failing.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from rtt import index, package, server, vector
+from tests.test_server import FakeEmbedder, _make_rtt
+
+
+def _count_loads(monkeypatch) -> list[Path]:
+    loaded: list[Path] = []
+    original = package.load_metadata
+
+    def load_metadata(rtt_path: Path, columns: list[str] | None = None):
+        loaded.append(rtt_path)
+        return original(rtt_path, columns)
+
+    monkeypatch.setattr(package, "load_metadata", load_metadata)
+    return loaded
+
+
+def test_build_is_incremental(tmp_path, monkeypatch):
+    src = tmp_path / "videos"
+    src.mkdir()
+    _make_rtt(src, video_id="vid1", collection="prelinger")
+    _make_rtt(src, video_id="vid2", collection="youtube")
+    out = tmp_path / "corpus.rttidx"
+    loaded = _count_loads(monkeypatch)
+
+    assert index.build([src], out)
+    assert sorted(p.name for p in loaded) == ["vid1.rtt", "vid2.rtt"]
+    assert vector.Database.open(out).count() == 4
+
+    loaded.clear()
+    os.utime(src / "vid1.rtt", ns=(1, 1))
+    assert index.build([src], out)
+    assert loaded == []
+
+    _make_rtt(src, video_id="vid3", collection="youtube")
+    (src / "vid2.rtt").unlink()
+    assert index.build([src], out)
+    assert [p.name for p in loaded] == ["vid3.rtt"]
+
+    db = vector.Database.open(out)
+    videos, paths = index.open_videos(out)
+    assert db.count() == 4
+    assert set(videos) == {"vid1", "vid3"}
+    assert paths["vid3"] == src / "vid3.rtt"
+    assert db.get_segment("vid2_00000") is None
+    assert db.get_segment("vid1_00001")["collection"] == "prelinger"
+
+
+
+def test_build_extends_saved_keyword_index(tmp_path, monkeypatch):
+    src = tmp_path / "videos"
+    src.mkdir()
+    _make_rtt(src, video_id="vid1")
+    _make_rtt(src, video_id="vid2")
+    out = tmp_path / "corpus.rttidx"
+    assert index.build([src], out)
+    assert not (out / vector.LEXICAL_DIR).exists()
+    assert index.build([src], out, lexical=True)
+    assert vector.BM25Index.load(out / vector.LEXICAL_DIR).count == 4
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("keyword index rebuilt from scratch")
+
+    monkeypatch.setattr(vector.BM25Index, "build", no_rebuild)
+    _make_rtt(src, video_id="vid3")
+    (src / "vid2.rtt").unlink()
+    assert index.build([src], out, lexical=True)
+    db = vector.Database.open(out, lexical=True)
+    assert db._lexical.count == db.count() == 4
+    found = db.search_text("chocolate", n=5)
+    assert sorted(r["segment_id"] for r in found) == ["vid1_00001", "vid3_00001"]
+
+    assert index.build([src], out)
+    assert not (out / vector.LEXICAL_DIR).exists()
+
+
+def test_serve_from_index(tmp_path):
+    src = tmp_path / "videos"
+    src.mkdir()
+    _make_rtt(src, video_id="vid1", collection="prelinger")
+    out = tmp_path / "corpus.rttidx"
+    index.build([src], out)
+
+    client = TestClient(server.open_app(out, embedder=FakeEmbedder()))
+    results = client.get("/search?q=nuclear+bomb").json()["results"]
+    assert results[0]["segment_id"] == "vid1_00000"
+    assert client.get(results[0]["frame_url"]).status_code == 200
+
+
+def test_parallel_load_matches_sequential(tmp_path):
+    for i in range(12):
+        _make_rtt(tmp_path, video_id=f"vid{i:02d}", collection=f"c{i % 3}")
+    files = index.collect_rtt_files([tmp_path])
+    assert [p for p, _ in index.load_in_parallel(files, workers=4)] == files
+
+    sequential, parallel = vector.Database.memory(), vector.Database.memory()
+    videos, paths = index.load_rtt_files(sequential, [tmp_path], workers=1)
+    assert index.load_rtt_files(parallel, [tmp_path], workers=4) == (videos, paths)
+    assert parallel.collection_counts() == sequential.collection_counts() == {"c0": 8, "c1": 8, "c2": 8}
@@ -1,10 +1,12 @@
 import json
+import struct
 import tempfile
 import zipfile
 from pathlib import Path
 
 import pyarrow.parquet as pq
 import pyarrow as pa
+import pytest
 
 from rtt import types as t, package
 
@@ -89,3 +91,146 @@ def test_round_trip():
         assert loaded_video.status == "ready"
         assert len(loaded_segments) == 3
         assert len(arrow_table) == 3
+
+
+def test_load_metadata_reads_header_and_selected_columns():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        rtt_path = tmp / "test.rtt"
+        package.create(_make_video(), _make_segments(), None, rtt_path)
+
+        with zipfile.ZipFile(rtt_path) as zf:
+            header = json.loads(zf.read(package.HEADER_FILE))
+        assert "segments" not in header and header["title"] == "Test Video"
+
+        video, table = package.load_metadata(rtt_path, columns=["segment_id", "start_seconds", "missing"])
+        assert video.source_url == "https://example.com/test" and video.status == "ready"
+        assert table.column_names == ["segment_id", "start_seconds"]
+
+        legacy = tmp / "legacy.rtt"
+        with zipfile.ZipFile(rtt_path) as src, zipfile.ZipFile(legacy, "w") as dst:
+            for name in src.namelist():
+                if name != package.HEADER_FILE:
+                    dst.writestr(name, src.read(name))
+        legacy_video, legacy_table = package.load_metadata(legacy)
+        assert legacy_video == video
+        assert len(legacy_table.column_names) == 11
+
+
+def _data_offset(path: Path, info: zipfile.ZipInfo) -> int:
+    with open(path, "rb") as f:
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = struct.unpack("<HH", f.read(4))
+    return info.header_offset + 30 + name_len + extra_len
+
+
+def _write_v1(video: t.Video, segments: list[t.Segment], frames: dict[str, bytes], path: Path, **fields):
+    table = pa.table({
+        "segment_id": [s.segment_id for s in segments],
+        "video_id": [s.video_id for s in segments],
+        "start_seconds": [s.start_seconds for s in segments],
+        "text_embedding": [s.text_embedding for s in segments],
+    })
+    manifest = {
+        "video_id": video.video_id, "status": "ready", "title": video.title, "source_url": video.source_url,
+        "context": video.context, "duration_seconds": video.duration_seconds, "segments": [], **fields,
+    }
+    buf = pa.BufferOutputStream()
+    pq.write_table(table, buf)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("manifest.json", json.dumps(manifest))
+        zf.writestr("segments.parquet", buf.getvalue().to_pybytes())
+        for name, data in frames.items():
+            zf.writestr(name, data)
+
+
+def test_v2_layout_is_stored_aligned_float16():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        frames_dir = tmp / "frames"
+        frames_dir.mkdir()
+        (frames_dir / "000000.jpg").write_bytes(b"\xff\xd8fake")
+        rtt_path = package.create(_make_video(), _make_segments(), frames_dir, tmp / "test.rtt")
+
+        with zipfile.ZipFile(rtt_path) as zf:
+            assert json.loads(zf.read("manifest.json"))["format_version"] == package.FORMAT_VERSION
+            assert zf.read("frames/000000.jpg") == b"\xff\xd8fake"
+            for info in zf.infolist():
+                assert info.compress_type == zipfile.ZIP_STORED
+                assert _data_offset(rtt_path, info) % package.ENTRY_ALIGNMENT == 0
+            assert _data_offset(rtt_path, zf.getinfo("segments.parquet")) % package.PAGE_ALIGNMENT == 0
+
+        _, table = package.load_metadata(rtt_path)
+        assert table.schema.field("text_embedding").type == pa.list_(pa.float16(), 768)
+        assert table.column("text_embedding")[2].as_py()[0] == 2.0
+
+
+@pytest.mark.parametrize("fields", [{}, {"format_version": 1}])
+def test_upgrade_v1_in_place(fields):
+    with tempfile.TemporaryDirectory() as tmp:
+        rtt_path = Path(tmp) / "old.rtt"
+        _write_v1(_make_video(), _make_segments(), {"frames/000000.jpg": b"\xff\xd8old"}, rtt_path, **fields)
+        video, table = package.load_metadata(rtt_path)
+        assert table.schema.field("text_embedding").type == pa.list_(pa.float64())
+
+        assert package.upgrade(rtt_path)
+        assert not package.upgrade(rtt_path)
+        upgraded_video, upgraded = package.load_metadata(rtt_path)
+        assert upgraded_video == video
+        assert upgraded.schema.field("text_embedding").type == pa.list_(pa.float16(), 768)
+        assert upgraded.column("segment_id").to_pylist() == table.column("segment_id").to_pylist()
+        assert upgraded.column("text_embedding")[1].as_py() == [1.0] * 768
+        with zipfile.ZipFile(rtt_path) as zf:
+            assert zf.read("frames/000000.jpg") == b"\xff\xd8old"
+            assert package.HEADER_FILE in zf.namelist()
+
+
+def test_archive_pool_reads_frames_and_evicts():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        frames_dir = tmp / "frames"
+        frames_dir.mkdir()
+        (frames_dir / "000000.jpg").write_bytes(b"\xff\xd8new")
+        v2 = package.create(_make_video(), _make_segments(), frames_dir, tmp / "v2.rtt")
+        v1 = tmp / "v1.rtt"
+        _write_v1(_make_video(), _make_segments(), {"frames/000000.jpg": b"\xff\xd8old" * 100}, v1)
+
+        pool = package.ArchivePool(max_open=1)
+        assert pool.read(v2, "frames/000000.jpg") == b"\xff\xd8new"
+        assert pool.read(v1, "frames/000000.jpg") == b"\xff\xd8old" * 100
+        assert list(pool._open) == [str(v1)]
+        assert pool.read(v2, "frames/000000.jpg") == b"\xff\xd8new"
+        with pytest.raises(KeyError):
+            pool.read(v2, "frames/missing.jpg")
+
+        (frames_dir / "000000.jpg").write_bytes(b"\xff\xd8newer")
+        package.create(_make_video(), _make_segments(), frames_dir, tmp / "v2.rtt.tmp").replace(v2)
+        assert pool.read(v2, "frames/000000.jpg") == b"\xff\xd8new"
+        pool.discard(v2)
+        assert pool.read(v2, "frames/000000.jpg") == b"\xff\xd8newer"
+        pool.close()
+        assert not pool._open
+
+
+def test_archive_pool_caches_frame_bytes():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        frames_dir = tmp / "frames"
+        frames_dir.mkdir()
+        for i in range(3):
+            (frames_dir / f"{i:06d}.jpg").write_bytes(b"\xff\xd8" + bytes([i]) * 98)
+        rtt_path = package.create(_make_video(), _make_segments(), frames_dir, tmp / "v.rtt")
+
+        pool = package.ArchivePool(cache_bytes=250)
+        for name in ["000000.jpg", "000001.jpg", "000000.jpg", "000002.jpg", "000001.jpg"]:
+            assert pool.read(rtt_path, f"frames/{name}")[2] == int(name[5])
+        stats = pool.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
+        assert stats["entries"] == 2 and stats["bytes"] == 200
+
+        rtt_path.unlink()
+        assert pool.read(rtt_path, "frames/000001.jpg")[2] == 1
+        pool.discard(rtt_path)
+        assert pool.stats()["entries"] == 0
+        with pytest.raises(FileNotFoundError):
+            pool.read(rtt_path, "frames/000001.jpg")
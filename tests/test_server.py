@@ -1,3 +1,4 @@
+import asyncio
 import json
 import tempfile
 import zipfile
@@ -127,6 +128,50 @@ def test_frame_url_resolves(client):
         assert img_resp.status_code == 200
 
 
+def test_frames_served_from_cache(client):
+    frame_url = client.get("/static/segments?limit=1").json()["segments"][0]["frame_url"]
+    before = client.get("/stats").json()["frame_cache"]
+    first = client.get(frame_url)
+    second = client.get(frame_url)
+    after = client.get("/stats").json()["frame_cache"]
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert after["hits"] - before["hits"] >= 1
+    assert after["bytes"] > 0
+
+
+def test_frame_from_unreadable_archive_is_500(client, rtt_dir):
+    frame_url = client.get("/static/segments?limit=1").json()["segments"][0]["frame_url"]
+    rtt_path = rtt_dir / "test.rtt"
+    data = rtt_path.read_bytes()
+    rtt_path.write_bytes(data[:len(data) // 2])
+    resp = client.get(frame_url)
+    assert resp.status_code == 500
+    assert "test.rtt" in resp.json()["detail"]
+
+    rtt_path.write_bytes(data)
+    with zipfile.ZipFile(rtt_path) as src:
+        entries = [(name, src.read(name)) for name in src.namelist()]
+    with zipfile.ZipFile(rtt_path, "w", zipfile.ZIP_BZIP2) as dst:
+        for name, data in entries:
+            dst.writestr(name, data)
+    resp = client.get(frame_url)
+    assert resp.status_code == 500
+    assert "Unsupported compression" in resp.json()["detail"]
+
+
+def test_frame_from_archive_being_replaced_is_503(client, rtt_dir):
+    frame_url = client.get("/static/segments?limit=1").json()["segments"][0]["frame_url"]
+    live = client.app.state.live
+    live.watch([rtt_dir], interval=3600)
+    try:
+        rtt_path = rtt_dir / "test.rtt"
+        rtt_path.write_bytes(rtt_path.read_bytes()[:100])
+        assert client.get(frame_url).status_code == 503
+    finally:
+        live.stop()
+
+
 def test_source_url_resolves_for_local_video(client):
     resp = client.get("/search?q=nuclear+bomb")
     r = resp.json()["results"][0]
@@ -178,6 +223,24 @@ def test_collections_multi(multi_client):
     assert "youtube" in ids
 
 
+def test_search_hybrid_mode(rtt_dir):
+    from rtt import server
+    client = TestClient(server.create_app(rtt_dir, embedder=FakeEmbedder(), lexical=True))
+    results = client.get("/search?q=chocolate+cake&mode=hybrid").json()["results"]
+    assert [r["segment_id"] for r in results] == ["test_00001", "test_00000"]
+    assert results[0]["score"] == pytest.approx(2 / 61)
+    assert results[1]["score"] == pytest.approx(1 / 62)
+    assert client.get("/search?segment_id=test_00000&mode=hybrid").json()["results"][0]["segment_id"] == "test_00000"
+    assert client.get("/search?q=cake&mode=keyword").status_code == 422
+
+
+def test_search_hybrid_mode_needs_keyword_index(client):
+    resp = client.get("/search?q=chocolate+cake&mode=hybrid")
+    assert resp.status_code == 400
+    assert "--hybrid" in resp.json()["detail"]
+    assert client.get("/search?q=chocolate+cake").status_code == 200
+
+
 def test_search_by_segment_id(client):
     resp = client.get("/search?segment_id=test_00000")
     assert resp.status_code == 200
@@ -210,3 +273,152 @@ def test_search_result_has_collection(client):
     r = resp.json()["results"][0]
     assert "collection" in r
     assert r["collection"] == "prelinger"
+
+
+def test_open_app_from_saved_index(rtt_dir, tmp_path):
+    from rtt import index, server, vector
+    db = vector.Database.memory()
+    videos, rtt_paths_by_video = index.load_rtt_files(db, [rtt_dir])
+    index.save(tmp_path / "index", db, videos, rtt_paths_by_video)
+
+    client = TestClient(server.open_app(tmp_path / "index", embedder=FakeEmbedder()))
+    results = client.get("/search?q=nuclear+bomb").json()["results"]
+    assert results[0]["segment_id"] == "test_00000"
+    assert results[0]["collection"] == "prelinger"
+    assert client.get(results[0]["frame_url"]).status_code == 200
+    assert client.get(results[0]["source_url"]).status_code == 200
+
+
+def test_watcher_applies_new_replaced_and_deleted_files(multi_collection_dir):
+    from rtt import server
+    app = server.create_app(multi_collection_dir, embedder=FakeEmbedder())
+    client = TestClient(app)
+    live = app.state.live
+    old = live.snapshot
+    assert not live.poll([multi_collection_dir])
+
+    _make_rtt(multi_collection_dir, video_id="vid3", title="Video 3", collection="youtube")
+    (multi_collection_dir / "vid1.rtt").unlink()
+    _make_rtt(multi_collection_dir, video_id="vid2", title="Video 2", collection="youtube", segments_data=[
+        dict(segment_id="vid2_new", start=0.0, end=4.0, raw="bomb", enriched="bomb",
+             emb=[1.0] + [0.0] * 767, frame=""),
+    ])
+    assert live.poll([multi_collection_dir])
+    assert live.snapshot is not old
+    assert {r["video_id"] for r in client.get("/search?q=nuclear+bomb").json()["results"]} == {"vid2"}
+
+    assert live.poll([multi_collection_dir])
+    assert not live.poll([multi_collection_dir])
+    assert {r["video_id"] for r in client.get("/search?q=nuclear+bomb").json()["results"]} == {"vid2", "vid3"}
+    assert old.db.count() == 4 and old.db.get_segment("vid1_00000") is not None
+    data = client.get("/segments").json()
+    assert data["total"] == 3
+    assert {s["segment_id"] for s in data["segments"]} == {"vid2_new", "vid3_00000", "vid3_00001"}
+    assert client.get("/search?segment_id=vid1_00000").status_code == 404
+    assert client.get("/static/video/vid1/segments").status_code == 404
+    collections = client.get("/collections").json()["collections"]
+    assert [(c["id"], c["video_count"], c["segment_count"]) for c in collections] == [("youtube", 2, 3)]
+
+
+def test_watcher_keeps_video_when_replacement_fails_to_load(multi_collection_dir):
+    from rtt import server
+    app = server.create_app(multi_collection_dir, embedder=FakeEmbedder())
+    live = app.state.live
+    (multi_collection_dir / "vid1.rtt").write_bytes(b"PK half-written archive")
+    assert not live.poll([multi_collection_dir])
+    live.poll([multi_collection_dir])
+    assert live.snapshot.db.get_segment("vid1_00000") is not None
+    assert "vid1" in live.snapshot.videos and live.snapshot.db.count() == 4
+
+
+def test_search_results_cached_until_index_changes(multi_collection_dir):
+    from rtt import server
+
+    class CountingEmbedder(FakeEmbedder):
+        calls = 0
+
+        def embed_batch(self, texts):
+            CountingEmbedder.calls += len(texts)
+            return super().embed_batch(texts)
+
+    app = server.create_app(multi_collection_dir, embedder=CountingEmbedder())
+    client = TestClient(app)
+    first = client.get("/search?q=Nuclear+bomb&collections=youtube,prelinger").json()
+    again = client.get("/search?q=nuclear++bomb&collections=prelinger,youtube").json()
+    assert again["query"] == "nuclear  bomb"
+    assert again["results"] == first["results"]
+    assert CountingEmbedder.calls == 1
+    similar = client.get("/search?segment_id=vid1_00000").json()
+    assert client.get("/search?segment_id=vid1_00000").json() == similar
+    assert similar["query"] == "similar:vid1_00000"
+    stats = client.get("/stats").json()["result_cache"]
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (2, 2, 0)
+
+    (multi_collection_dir / "vid1.rtt").unlink()
+    app.state.live.poll([multi_collection_dir])
+    assert {r["video_id"] for r in client.get("/search?q=nuclear+bomb").json()["results"]} == {"vid2"}
+    assert CountingEmbedder.calls == 2
+    stats = client.get("/stats").json()["result_cache"]
+    assert stats["invalidations"] == 1 and stats["entries"] == 1
+
+
+def test_text_and_similar_searches_do_not_share_cache_entries(client):
+    similar = client.get("/search?segment_id=test_00000").json()
+    literal = client.get("/search?q=similar:test_00000").json()
+    assert literal["results"] != similar["results"]
+    assert client.get("/stats").json()["result_cache"]["hits"] == 0
+
+    assert client.get("/search?q=similar:missing").status_code == 200
+    assert client.get("/search?segment_id=missing").status_code == 404
+
+
+def test_search_awaits_async_embedder(rtt_dir):
+    from rtt import server
+
+    class AsyncFakeEmbedder:
+        async def embed(self, text: str) -> list[float]:
+            await asyncio.sleep(0)
+            return FakeEmbedder().embed(text)
+
+        async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+            return FakeEmbedder().embed_batch(texts)
+
+    client = TestClient(server.create_app(rtt_dir, embedder=AsyncFakeEmbedder(), search_threads=2))
+    results = client.get("/search?q=nuclear+bomb").json()["results"]
+    assert results[0]["segment_id"] == "test_00000"
+    assert client.get("/search?segment_id=missing").status_code == 404
+
+
+async def test_concurrent_searches_share_embedding_and_scoring_batches(multi_collection_dir):
+    import httpx
+    from rtt import embed, server
+
+    class AsyncFakeEmbedder:
+        calls: list[list[str]] = []
+
+        async def embed(self, text: str) -> list[float]:
+            return (await self.embed_batch([text]))[0]
+
+        async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+            self.calls.append(texts)
+            return FakeEmbedder().embed_batch(texts)
+
+    inner = AsyncFakeEmbedder()
+    app = server.create_app(
+        multi_collection_dir, embedder=embed.BatchingEmbedder(inner, window=0.05), batch_window=0.05,
+    )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        queries = ["nuclear bomb", "chocolate cake", "bomb drill", "cake recipe"]
+        responses = await asyncio.gather(
+            *[client.get(f"/search?q={q}&n={1 + i % 2}") for i, q in enumerate(queries)],
+            client.get("/search?q=nuclear&collections=youtube"),
+        )
+        stats = (await client.get("/stats")).json()
+    results = [r.json()["results"] for r in responses]
+    assert [len(r) for r in results] == [1, 2, 1, 2, 2]
+    assert results[0][0]["segment_id"] in ("vid1_00000", "vid2_00000")
+    assert results[1][0]["segment_id"] in ("vid1_00001", "vid2_00001")
+    assert results[4][0]["segment_id"] == "vid2_00000"
+    assert len(inner.calls) == 1 and len(inner.calls[0]) == 5
+    assert stats["score_batches"] == {"batches": 1, "queries": 5}
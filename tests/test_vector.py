@@ -1,3 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
 from rtt import types as t
 from rtt import vector
 
@@ -43,3 +49,556 @@ def test_merge():
     results = db1.closest(emb, n=10)
     ids = {r["segment_id"] for r in results}
     assert ids == {"s1", "s2"}
+
+
+def _clustered_table(count: int = 2000, clusters: int = 20, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, 768)).astype(np.float32)
+    emb = centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, 768)).astype(np.float32)
+    table = pa.table({
+        "segment_id": [f"s{i}" for i in range(count)],
+        "video_id": [f"v{i % 10}" for i in range(count)],
+        "start_seconds": [float(i) for i in range(count)],
+        "collection": ["a" if i % 2 else "b" for i in range(count)],
+        "text_embedding": pa.FixedSizeListArray.from_arrays(pa.array(emb.ravel()), 768),
+    })
+    return table, emb
+
+
+def test_ivf_matches_exact_top_result():
+    table, emb = _clustered_table()
+    exact = vector.Database.memory()
+    ivf = vector.Database.memory(engine="ivf", nprobe=4)
+    exact.add_table(table)
+    ivf.add_table(table)
+
+    for i in (0, 17, 1234):
+        want = exact.closest(emb[i].tolist(), n=5)
+        got = ivf.closest(emb[i].tolist(), n=5)
+        assert got[0]["segment_id"] == want[0]["segment_id"] == f"s{i}"
+    assert ivf._ivf is not None and ivf._ivf.nlist > 1
+
+
+def test_ivf_collection_filter(monkeypatch):
+    monkeypatch.setattr(vector, "EXACT_SCAN_ROWS", 0)
+    table, emb = _clustered_table()
+    db = vector.Database.memory(engine="ivf", nprobe=2)
+    db.add_table(table)
+    results = db.closest(emb[3].tolist(), n=20, collections=["a"])
+    assert len(results) == 20
+    assert all(r["collection"] == "a" for r in results)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        vector.Database.memory(engine="nope")
+
+
+def test_hnsw_matches_exact_top_result():
+    table, emb = _clustered_table(count=1000)
+    exact = vector.Database.memory()
+    hnsw = vector.Database.memory(engine="hnsw")
+    exact.add_table(table)
+    hnsw.add_table(table)
+
+    for i in (0, 17, 999):
+        want = exact.closest(emb[i].tolist(), n=5)
+        got = hnsw.closest(emb[i].tolist(), n=5)
+        assert got[0]["segment_id"] == want[0]["segment_id"] == f"s{i}"
+
+
+def test_hnsw_collection_filter(monkeypatch):
+    monkeypatch.setattr(vector, "EXACT_SCAN_ROWS", 0)
+    table, emb = _clustered_table(count=1000)
+    db = vector.Database.memory(engine="hnsw")
+    db.add_table(table)
+    results = db.closest(emb[3].tolist(), n=20, collections=["a"])
+    assert len(results) == 20
+    assert all(r["collection"] == "a" for r in results)
+
+
+def test_hnsw_selective_filter_falls_back_to_exact(monkeypatch):
+    table, emb = _clustered_table(count=2000)
+    rare = ["rare" if i % 50 == 0 else "common" for i in range(2000)]
+    table = table.set_column(table.schema.get_field_index("collection"), "collection", pa.array(rare))
+    db = vector.Database.memory(engine="hnsw")
+    db.add_table(table)
+
+    def no_walk(*args):
+        raise AssertionError("walked the graph for a small selection")
+
+    monkeypatch.setattr(db, "_closest_hnsw", no_walk)
+    assert db.closest(emb[100].tolist(), n=1, collections=["rare"])[0]["segment_id"] == "s100"
+    assert len(db.closest(emb[100].tolist(), n=50, collections=["rare"])) == 40
+
+    monkeypatch.undo()
+    monkeypatch.setattr(vector, "EXACT_SCAN_ROWS", 0)
+    q = emb[100] / np.linalg.norm(emb[100])
+    mask = db._runs_mask(db._selected_runs(["rare"]))
+    assert len(db._hnsw.search(db._embeddings, q, 10, db.ef_search, mask)[0]) == 0
+    assert len(db._hnsw.search(db._embeddings, q, 10, db.ef_search)[0]) == 10
+    assert db.closest(emb[100].tolist(), n=1, collections=["rare"])[0]["segment_id"] == "s100"
+
+
+def test_hnsw_graph_saved_and_reloaded(tmp_path):
+    table, emb = _clustered_table(count=500)
+    graph_path = tmp_path / "segments.hnsw"
+    first = vector.Database.memory(engine="hnsw", graph_path=graph_path)
+    first.add_table(table.slice(0, 250))
+    first.add_table(table.slice(250))
+    first._ensure_merged()
+    assert graph_path.exists()
+
+    second = vector.Database.memory(engine="hnsw", graph_path=graph_path)
+    second.add_table(table.slice(250))
+    second.add_table(table.slice(0, 250))
+    second._ensure_merged()
+    assert second._hnsw.ids.tolist() == second._merged.column("segment_id").to_pylist()
+    for i in (1, 260, 499):
+        assert second.closest(emb[i].tolist(), n=1)[0]["segment_id"] == f"s{i}"
+
+
+def test_hnsw_graph_updated_for_changed_segments(tmp_path, monkeypatch):
+    table, emb = _clustered_table(count=600)
+    graph_path = tmp_path / "segments.hnsw"
+    first = vector.Database.memory(engine="hnsw", graph_path=graph_path)
+    first.add_table(table.slice(0, 400))
+    first._ensure_merged()
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("graph rebuilt from scratch")
+
+    monkeypatch.setattr(vector.HNSWIndex, "build", no_rebuild)
+    second = vector.Database.memory(engine="hnsw", graph_path=graph_path)
+    second.add_table(table.slice(100))
+    second._ensure_merged()
+    assert second.count() == 500
+    for i in (101, 250, 420, 599):
+        assert second.closest(emb[i].tolist(), n=1)[0]["segment_id"] == f"s{i}"
+    assert not {r["segment_id"] for r in second.closest(emb[5].tolist(), n=50)} & {f"s{i}" for i in range(100)}
+    saved = vector.HNSWIndex.load(graph_path)
+    assert sorted(saved.ids.tolist()) == sorted(f"s{i}" for i in range(100, 600))
+
+
+def test_int8_storage_reranks_to_exact_results():
+    table, emb = _clustered_table()
+    exact = vector.Database.memory()
+    quantized = vector.Database.memory(storage="int8", rerank=50)
+    exact.add_table(table)
+    quantized.add_table(table)
+
+    for i in (0, 17, 1234):
+        want = exact.closest(emb[i].tolist(), n=10)
+        got = quantized.closest(emb[i].tolist(), n=10)
+        assert [r["segment_id"] for r in got] == [r["segment_id"] for r in want]
+        assert got[0]["_distance"] == pytest.approx(want[0]["_distance"], abs=1e-3)
+    assert quantized._store.nbytes == exact._store.nbytes // 2
+
+
+def test_int8_storage_with_filter_and_ivf(monkeypatch):
+    monkeypatch.setattr(vector, "EXACT_SCAN_ROWS", 0)
+    table, emb = _clustered_table()
+    db = vector.Database.memory(engine="ivf", storage="int8")
+    db.add_table(table)
+    results = db.closest(emb[5].tolist(), n=10, collections=["a"])
+    assert results[0]["segment_id"] == "s5"
+    assert all(r["collection"] == "a" for r in results)
+
+
+def test_pq_storage_finds_exact_neighbours():
+    table, emb = _clustered_table()
+    db = vector.Database.memory(storage="pq", pq_m=48, rerank=100)
+    db.add_table(table)
+    for i in (0, 17, 1234):
+        assert db.closest(emb[i].tolist(), n=1)[0]["segment_id"] == f"s{i}"
+    assert db._store.nbytes == 2000 * 48
+    assert db.estimate_recall(k=10, queries=20) > 0.8
+
+
+def test_memory_budget_picks_storage():
+    assert vector.choose_storage(1000, 2000 * 768) == ("float16", 0)
+    assert vector.choose_storage(1000, 1000 * 768) == ("int8", 0)
+    assert vector.choose_storage(1000, 1000 * 100) == ("pq", 96)
+    assert vector.choose_storage(1000, 1000 * 20) == ("pq", 16)
+    assert vector.parse_size("512MB") == 512 * 2**20
+    assert vector.parse_size("1.5G") == 3 * 2**29
+    with pytest.raises(ValueError):
+        vector.parse_size("lots")
+
+    table, _ = _clustered_table()
+    db = vector.Database.memory(memory_budget=2000 * 64)
+    db.add_table(table)
+    db._ensure_merged()
+    assert (db.storage, db.pq_m) == ("pq", 64)
+
+
+def test_save_and_open_memory_mapped(tmp_path):
+    table, emb = _clustered_table()
+    db = vector.Database.memory()
+    db.add_table(table)
+    db.save(tmp_path / "index")
+
+    opened = vector.Database.open(tmp_path / "index")
+    assert isinstance(opened._embeddings, np.memmap)
+    assert opened.count() == 2000
+    for i in (0, 1234):
+        assert opened.closest(emb[i].tolist(), n=1)[0]["segment_id"] == f"s{i}"
+    assert opened.get_segment("s7")["video_id"] == "v7"
+
+    quantized = vector.Database.open(tmp_path / "index", storage="int8")
+    assert quantized.closest(emb[9].tolist(), n=1)[0]["segment_id"] == "s9"
+
+
+def test_rows_grouped_by_collection():
+    table, emb = _clustered_table(count=300)
+    db = vector.Database.memory()
+    db.add_table(table.slice(0, 100))
+    db.add_table(table.slice(100))
+    db._ensure_merged()
+
+    assert db.collection_counts() == {"a": 150, "b": 150}
+    assert db._collection_runs == {"a": [(0, 150)], "b": [(150, 300)]}
+    assert db.count(["a", "b", "a", "missing"]) == 300
+
+    page = db.list_segments(offset=140, limit=20, collections=["b", "a"])
+    assert [r["collection"] for r in page] == ["a"] * 10 + ["b"] * 10
+    assert db.list_segments(offset=290, limit=20, collections=["b"]) == []
+    assert db.closest(emb[0].tolist(), n=5, collections=["missing"]) == []
+    results = db.closest(emb[2].tolist(), n=200, collections=["b"])
+    assert results[0]["segment_id"] == "s2"
+    assert len(results) == 150 and all(r["collection"] == "b" for r in results)
+
+
+def test_value_runs_of_ungrouped_column():
+    runs = vector._value_runs(pa.chunked_array([["a", "a", "b", "a", None]]))
+    assert runs == {"a": [(0, 2), (3, 4)], "b": [(2, 3)], "": [(4, 5)]}
+
+
+def test_segment_and_video_lookups():
+    table, emb = _clustered_table(count=300)
+    db = vector.Database.memory()
+    db.add_table(table.slice(150).take(pa.array(range(149, -1, -1))))
+    db.add_table(table.slice(0, 150))
+
+    row = db.get_segment("s42")
+    assert row["video_id"] == "v2"
+    assert np.allclose(row["text_embedding"], emb[42] / np.linalg.norm(emb[42]), atol=1e-2)
+    assert db.get_segment("missing") is None
+
+    assert len(db._video_runs["v3"]) == 2
+    segments = db.video_segments("v3")
+    assert [r["start_seconds"] for r in segments] == [float(i) for i in range(3, 300, 10)]
+    assert db.video_segments("missing") == []
+
+
+@pytest.mark.parametrize("options", [
+    {}, {"storage": "int8"}, {"storage": "pq", "pq_m": 48}, {"engine": "ivf", "nprobe": 64}, {"engine": "hnsw"},
+])
+def test_append_after_merge_matches_full_build(options):
+    table, emb = _clustered_table(count=600)
+    full = vector.Database.memory()
+    full.add_table(table)
+    db = vector.Database.memory(**options)
+    db.add_table(table.slice(0, 400))
+    db.compact()
+    for start in range(400, 600, 50):
+        db.add_table(table.slice(start, 50))
+
+    assert db.count() == 600 and db.collection_counts() == {"a": 300, "b": 300}
+    assert len(db._collection_runs["a"]) <= 5
+    for i in (3, 450, 599):
+        found = db.closest(emb[i].tolist(), n=5)
+        assert found[0]["segment_id"] == f"s{i}"
+        assert [r["segment_id"] for r in found] == [r["segment_id"] for r in full.closest(emb[i].tolist(), n=5)]
+    assert db.get_segment("s599")["start_seconds"] == 599.0
+    assert [r["start_seconds"] for r in db.video_segments("v9")] == [float(i) for i in range(9, 600, 10)]
+    assert all(r["collection"] == "a" for r in db.closest(emb[500].tolist(), n=50, collections=["a"]))
+
+
+def test_append_table_keeps_few_chunks():
+    table = pa.table({"x": [0]})
+    for i in range(1, 1000):
+        table = vector._append_table(table, pa.table({"x": [i]}))
+    assert table.column("x").to_pylist() == list(range(1000))
+    assert table.column("x").num_chunks <= 10
+
+
+def test_ivf_add_folds_tail_into_lists():
+    _, emb = _clustered_table(count=400)
+    ivf = vector.IVFIndex.build(emb[:100], nlist=8)
+    ivf.add(emb[100:150], 100)
+    assert ivf._tail == 50
+    assert sorted(ivf.candidates(emb[0], nprobe=8).tolist()) == list(range(150))
+    ivf.add(emb[150:400], 150)
+    assert ivf._tail == 0 and ivf.offsets[-1] == 400
+    assert sorted(ivf.candidates(emb[0], nprobe=8).tolist()) == list(range(400))
+
+
+@pytest.mark.parametrize("engine", ["exact", "ivf", "hnsw"])
+def test_updated_removes_and_adds_videos_without_touching_original(engine, tmp_path):
+    table, emb = _clustered_table(count=400)
+    db = vector.Database.memory(engine=engine, nprobe=64)
+    db.add_table(table.slice(0, 300))
+    db.compact()
+
+    generation = db.generation
+    new = db.updated(["v3", "v4"], [table.slice(300)])
+    assert db.generation == generation and new.generation > generation
+    assert db.count() == 300 and new.count() == 300 - 60 + 100
+    assert new.collection_counts() == {"a": 170, "b": 170}
+    assert db.get_segment("s3") is not None and new.get_segment("s3") is None
+    assert [r["segment_id"] for r in new.video_segments("v3")] == [f"s{i}" for i in range(303, 400, 10)]
+    assert len(db.video_segments("v3")) == 30
+    removed = {f"s{i}" for i in range(300) if i % 10 in (3, 4)}
+    assert not removed & {r["segment_id"] for r in new.closest(emb[3].tolist(), n=50)}
+    assert new.closest(emb[350].tolist(), n=1)[0]["segment_id"] == "s350"
+    assert db.closest(emb[350].tolist(), n=1)[0]["segment_id"] != "s350"
+    assert len(new.list_segments(limit=400)) == 340
+    assert not removed & {r["segment_id"] for r in new.list_segments(limit=400, collections=["a"])}
+
+    new.save(tmp_path / "index")
+    assert vector.Database.open(tmp_path / "index").count() == 340
+
+
+@pytest.mark.parametrize("options", [
+    {}, {"engine": "ivf", "nprobe": 64}, {"engine": "hnsw"}, {"storage": "int8"}, {"storage": "pq", "pq_m": 8},
+])
+def test_updated_compacts_rows_once_removals_pass_fraction(options, monkeypatch):
+    monkeypatch.setattr(vector, "TOMBSTONE_FRACTION", 0.1)
+    table, emb = _transcribed_table()
+    db = vector.Database.memory(lexical=True, **options)
+    db.add_table(table.slice(0, 500))
+    db.compact()
+
+    kept = db.updated(["v3"])
+    assert kept._removed == 50 and len(kept._embeddings) == 500
+    new = kept.updated(["v4"], [table.slice(500)])
+    assert new._removed == 0 and len(new._embeddings) == new.count() == 500
+    assert len(new._merged) == new._lexical.count == 500
+    assert kept._removed == 50 and len(kept._merged) == 500 and len(db._embeddings) == 500
+    assert new.collection_counts() == {"a": 250, "b": 250}
+    assert new.get_segment("s4") is None and new.get_segment("s5")["segment_id"] == "s5"
+    assert [r["segment_id"] for r in new.video_segments("v3")] == [f"s{i}" for i in range(503, 600, 10)]
+    for i in (5, 350, 550):
+        assert new.closest(emb[i].tolist(), n=1)[0]["segment_id"] == f"s{i}"
+    assert sorted(r["segment_id"] for r in new.search_text("hindenburg", n=5)) == ["s503", "s7"]
+    found = new.search_text("hindenburg", n=5, collections=["a"])
+    assert sorted(r["segment_id"] for r in found) == ["s503", "s7"]
+    assert len(new.list_segments(limit=600)) == 500
+    assert sorted(r["segment_id"] for r in db.search_text("hindenburg", n=5)) == ["s304", "s7"]
+
+
+def test_subtract_runs():
+    assert vector._subtract_runs([(0, 10), (20, 30)], [(2, 4), (8, 22), (25, 30)]) == [(0, 2), (4, 8), (22, 25)]
+
+
+def test_append_conforms_table_to_merged_schema():
+    table, emb = _clustered_table(count=20)
+    db = vector.Database.memory()
+    db.add_table(table.slice(0, 10).append_column("source", pa.array(["transcript"] * 10)))
+    db.compact()
+    db.add_table(table.slice(10))
+    assert db.get_segment("s15")["source"] is None
+    assert db.closest(emb[15].tolist(), n=1)[0]["segment_id"] == "s15"
+
+
+@pytest.mark.parametrize("options", [{}, {"storage": "int8"}, {"engine": "ivf", "nprobe": 64}])
+def test_closest_batch_matches_closest(options, monkeypatch):
+    monkeypatch.setattr(vector, "CHUNK", 128)
+    table, emb = _clustered_table(count=1000)
+    db = vector.Database.memory(**options)
+    db.add_table(table)
+    db.compact()
+    db = db.updated(["v3"])
+    queries = [emb[i].tolist() for i in (0, 3, 500, 999)] + [[0.0] * 768]
+    for n, collections in [(5, None), (40, ["a"]), (2000, ["b", "a"])]:
+        batch = db.closest_batch(queries, n=n, collections=collections)
+        single = [db.closest(q, n=n, collections=collections) for q in queries]
+        assert [[r["segment_id"] for r in rows] for rows in batch] == [[r["segment_id"] for r in rows] for rows in single]
+        assert batch[1][0]["_distance"] == pytest.approx(single[1][0]["_distance"])
+    assert batch[-1] == [] and db.closest_batch([], n=5) == []
+
+
+@pytest.mark.parametrize("options", [{}, {"storage": "int8"}, {"engine": "hnsw"}])
+def test_closest_many_returns_padded_arrays(options, monkeypatch):
+    monkeypatch.setattr(vector, "CHUNK", 100)
+    table, emb = _clustered_table(count=500)
+    db = vector.Database.memory(**options)
+    db.add_table(table)
+    queries = np.stack([emb[0], emb[250], np.zeros(768, dtype=np.float32)])
+
+    rows, scores = db.closest_many(queries, n=7, collections=["a"])
+    assert rows.shape == scores.shape == (3, 7)
+    ids = db.segment_ids(rows)
+    for i in range(2):
+        assert ids[i].tolist() == [r["segment_id"] for r in db.closest(queries[i].tolist(), n=7, collections=["a"])]
+        assert (np.diff(scores[i]) <= 1e-6).all()
+    assert (rows[2] == -1).all() and (scores[2] == -np.inf).all() and ids[2].tolist() == [None] * 7
+
+    rows, scores = db.closest_many(queries[:1], n=300, collections=["b"])
+    assert (rows[0, :250] >= 0).all() and (rows[0, 250:] == -1).all()
+    assert db.closest_many(np.empty((0, 768)), n=5)[0].shape == (0, 5)
+
+
+def test_split_runs():
+    assert vector._split_runs([(0, 5), (10, 20)], 3) == [[(0, 5)], [(10, 15)], [(15, 20)]]
+    assert vector._split_runs([(0, 7)], 2) == [[(0, 4)], [(4, 7)]]
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_sharded_scan_matches_serial(storage, monkeypatch):
+    monkeypatch.setattr(vector, "CHUNK", 64)
+    table, emb = _clustered_table(count=1000)
+    serial = vector.Database.memory(storage=storage)
+    sharded = vector.Database.memory(storage=storage, scan_threads=4)
+    for db in (serial, sharded):
+        db.add_table(table)
+        db.compact()
+    serial, sharded = serial.updated(["v5"]), sharded.updated(["v5"])
+    assert len(sharded._shards(sharded._live_runs())) == 4
+    for i, collections in [(0, None), (17, ["a"]), (999, ["b"])]:
+        want = serial.closest(emb[i].tolist(), n=25, collections=collections)
+        got = sharded.closest(emb[i].tolist(), n=25, collections=collections)
+        assert [r["segment_id"] for r in got] == [r["segment_id"] for r in want]
+    rows, scores = sharded.closest_many(emb[:8], n=25)
+    assert (rows == serial.closest_many(emb[:8], n=25)[0]).all()
+
+
+def test_scan_pool_created_once_and_shared_by_snapshots(monkeypatch):
+    monkeypatch.setattr(vector, "CHUNK", 64)
+    table, emb = _clustered_table(count=1000)
+    db = vector.Database.memory(scan_threads=4)
+    pool = db._scan_pool
+    db.add_table(table)
+    db.compact()
+    with ThreadPoolExecutor(max_workers=8) as requests:
+        list(requests.map(lambda i: db.closest(emb[i].tolist(), n=5), range(32)))
+    assert db._scan_pool is pool
+    assert db.updated(["v1"])._scan_pool is pool
+    db.scan_threads = 2
+    assert db.closest(emb[3].tolist(), n=1)[0]["segment_id"] == "s3"
+    assert db._scan_pool is not pool and pool._shutdown
+
+
+def test_float16_store_scores_through_scratch_buffer(monkeypatch):
+    monkeypatch.setattr(vector, "SCAN_BLOCK", 16)
+    monkeypatch.setattr(vector._scratch, "buffer", None, raising=False)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 768)).astype(np.float16)
+    store = vector.Float16Store(vectors)
+    q = rng.standard_normal(768).astype(np.float32)
+    queries = rng.standard_normal((3, 768)).astype(np.float32)
+    full = vectors.astype(np.float32)
+    rows = np.array([5, 99, 0, 42])
+    np.testing.assert_allclose(store.score(q, slice(10, 95)), full[10:95] @ q, rtol=1e-5)
+    np.testing.assert_allclose(store.score(q, rows), full[rows] @ q, rtol=1e-5)
+    np.testing.assert_allclose(store.score_batch(queries, slice(3, 60)), queries @ full[3:60].T, rtol=1e-5)
+    scratch = vector._scratch.buffer
+    store.score(q, slice(0, 100))
+    assert vector._scratch.buffer is scratch and len(scratch) == 16
+
+
+def test_exact_scan_keeps_bounded_top_k(monkeypatch):
+    monkeypatch.setattr(vector, "CHUNK", 64)
+    table, emb = _clustered_table(count=1000)
+    db = vector.Database.memory()
+    db.add_table(table)
+    db.compact()
+    q = emb[17] / np.linalg.norm(emb[17])
+    full = db._embeddings.astype(np.float32) @ q
+    for collections in (None, ["a"]):
+        runs = db._selected_runs(collections) if collections else db._live_runs()
+        allowed = np.concatenate([np.arange(start, stop) for start, stop in runs])
+        rows, scores = db._closest_exact(q, 25, runs)
+        want = allowed[np.argsort(-full[allowed], kind="stable")[:25]]
+        assert set(rows.tolist()) == set(want.tolist())
+        assert (np.diff(scores) <= 0).all()
+    state = db._store.prepare(q)
+    best_rows, best_scores = db._scan_shard(state, db._live_runs(), 25)
+    assert len(best_rows) == len(best_scores) == 25
+
+
+def _transcribed_table(count: int = 600):
+    table, emb = _clustered_table(count=count)
+    rng = np.random.default_rng(1)
+    words = np.array(["the", "film", "shows", "a", "city", "street", "farm", "school", "car", "house"])
+    texts = [" ".join(rng.choice(words, 12)) for _ in range(count)]
+    for i in (7, 304, 503):
+        texts[i] += " Hindenburg"
+    return table.append_column("transcript_raw", pa.array(texts)), emb
+
+
+def test_tokenize():
+    assert vector.tokenize("The HINDENBURG, at Lakehurst (1937)!") == ["the", "hindenburg", "at", "lakehurst", "1937"]
+    assert vector.tokenize("snake_case") == ["snake", "case"]
+
+
+def test_bm25_ranks_rare_terms_and_filters_runs():
+    table, _ = _transcribed_table()
+    index = vector.BM25Index.build(vector._segment_texts(table))
+    rows, scores = index.search("hindenburg film", 10, [(0, 600)])
+    assert sorted(rows[:3].tolist()) == [7, 304, 503]
+    assert (np.diff(scores) <= 0).all()
+    rows, _ = index.search("hindenburg", 10, [(0, 100), (500, 600)])
+    assert sorted(rows.tolist()) == [7, 503]
+    assert len(index.search("zeppelin", 10, [(0, 600)])[0]) == 0
+
+
+def test_bm25_add_matches_build():
+    table, _ = _transcribed_table()
+    texts = list(vector._segment_texts(table)) + ["zeppelin"]
+    full = vector.BM25Index.build(texts)
+    index = vector.BM25Index.build(texts[:100])
+    index.add(texts[100:150], 100)
+    assert index._tail > 0
+    index.add(texts[150:], 150)
+    assert index._tail == 0 and index.count == 601
+    for query in ("hindenburg", "city farm", "school car house"):
+        want_rows, want_scores = full.search(query, 20, [(0, 600)])
+        rows, scores = index.search(query, 20, [(0, 600)])
+        assert rows.tolist() == want_rows.tolist()
+        np.testing.assert_allclose(scores, want_scores, rtol=1e-3)
+    assert index.search("zeppelin", 5, [(0, 601)])[0].tolist() == [600]
+
+
+def test_search_text_follows_updates_and_saved_index(tmp_path):
+    table, _ = _transcribed_table()
+    db = vector.Database.memory(lexical=True)
+    db.add_table(table.slice(0, 500))
+    db.compact()
+    assert db._lexical.count == 500
+    found = db.search_text("Hindenburg", n=5)
+    assert sorted(r["segment_id"] for r in found) == ["s304", "s7"]
+    assert found[0]["_score"] > 0
+    assert [r["segment_id"] for r in db.search_text("hindenburg", n=5, collections=["a"])] == ["s7"]
+
+    new = db.updated(["v4"], [table.slice(500)])
+    assert new._lexical.count == 600 and db._lexical.count == 500
+    assert sorted(r["segment_id"] for r in new.search_text("hindenburg", n=5)) == ["s503", "s7"]
+    assert len(db.search_text("hindenburg", n=5)) == 2
+
+    new.save(tmp_path / "index")
+    opened = vector.Database.open(tmp_path / "index", lexical=True)
+    assert isinstance(opened._lexical.rows, np.memmap)
+    assert sorted(r["segment_id"] for r in opened.search_text("hindenburg", n=5)) == ["s503", "s7"]
+
+    plain = vector.Database.open(tmp_path / "index")
+    assert plain._lexical is None
+    with pytest.raises(ValueError):
+        plain.search_text("hindenburg")
+
+
+def test_hybrid_fuses_vector_and_text_rankings():
+    table, emb = _transcribed_table()
+    db = vector.Database.memory(lexical=True)
+    db.add_table(table)
+    db.compact()
+    found = db.hybrid(emb[304].tolist(), "hindenburg", n=5)
+    assert found[0]["segment_id"] == "s304"
+    assert found[0]["_score"] == pytest.approx(2 / (vector.RRF_K + 1), rel=0.02)
+    assert {"s7", "s503"} <= {r["segment_id"] for r in found}
+    text_only = db.hybrid([0.0] * 768, "hindenburg", n=5)
+    assert sorted(r["segment_id"] for r in text_only) == ["s304", "s503", "s7"]
+    batch = db.hybrid_batch([emb[304].tolist(), emb[10].tolist()], ["hindenburg", "hindenburg"], n=5, collections=["b"])
+    assert [r["segment_id"] for r in batch[0]][0] == "s304"
+    assert all(r["collection"] == "b" for found in batch for r in found)